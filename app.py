@@ -1,16 +1,40 @@
 """
 Main Flask application for Snacks Shop with POS System
 """
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file, Response, stream_with_context, abort, flash
 from werkzeug.utils import secure_filename
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
-from models import db, User, Product, Order, OrderItem, Setting, Offer
+from models import db, User, Product, ProductTombstone, Order, OrderItem, Setting, Offer, upgrade_schema
 from auth import login_required, admin_required, get_current_user
 from pdf_generator import generate_invoice_pdf
+from inventory import low_stock
+from barcode_index import barcode_index
+from labels import LABELS_PER_SHEET, internal_barcode, label_renderer
+from product_io import ImportFormatError, detect_format, iter_rows, import_products, export_products
+from checkout import CheckoutError, build_order, create_order, find_orders_by_keys, load_products, sync_orders
+from order_writer import order_writer
+from archive import ArchiveError, archive_closed_months, query_orders, get_order
+from reports import ReportError, close_day, is_day_closed, sales_report
+from forecasting import demand_forecaster
+from page_cache import page_cache, cached_page
+from snapshot import static_snapshot
+from catalog_sync import catalog_delta, parse_watermark
+from search import product_search
+from events import broker, dashboard_counters, publish_orders, stream_events, today_stats
+from journal import ORDER_CREATED, ORDER_DELETED, order_journal, order_snapshot, tail as tail_journal
+from promotions import PromotionError, RULE_TYPES, parse_rule, promotions
+from stores import current_store, use_store, shard_router
+from replica import read_only, replica_router
+from head_office import chain_sales
+from customers import find_customer, recent_orders, release_order, backfill as backfill_customers
+from read_models import (CARD_COLUMNS, MENU_COLUMNS, ADMIN_COLUMNS, product_rows, fetch,
+                         product_categories, paginate)
 from config import Config
 import os
 import json
-import uuid
+import click
+import time
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -18,6 +42,21 @@ app.config.from_object(Config)
 # Initialize database
 db.init_app(app)
 
+# Size the rendered page cache, the low-stock index, the label symbol cache and pool, the
+# dashboard event queues and counters, and the checkout writer and journal batches
+page_cache.max_bytes = app.config['PAGE_CACHE_MAX_BYTES']
+low_stock.ttl = app.config['LOW_STOCK_TTL']
+label_renderer.symbols.max_bytes = app.config['LABEL_SYMBOL_CACHE_BYTES']
+label_renderer.pool_threshold = app.config['LABEL_POOL_THRESHOLD']
+label_renderer.workers = app.config['LABEL_POOL_WORKERS']
+broker.queue_size = app.config['EVENT_QUEUE_SIZE']
+dashboard_counters.ttl = app.config['DASHBOARD_COUNTERS_TTL']
+order_writer.max_batch = app.config['ORDER_WRITER_MAX_BATCH']
+order_writer.max_delay = app.config['ORDER_WRITER_MAX_DELAY']
+order_journal.max_batch = app.config['JOURNAL_MAX_BATCH']
+order_journal.max_delay = app.config['JOURNAL_MAX_DELAY']
+order_journal.max_retries = app.config['JOURNAL_MAX_RETRIES']
+
 # Create upload folder if it doesn't exist
 try:
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -31,6 +70,19 @@ def init_db():
         with app.app_context():
             # Create tables
             db.create_all()
+            upgrade_schema()
+            product_search.ensure()
+            
+            # A read-only connection to the same SQLite file needs WAL so readers never block the tills
+            if replica_router.enabled() and db.engine.dialect.name == 'sqlite':
+                with db.engine.connect() as conn:
+                    conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+            
+            # Create the order shards of the other stores
+            if shard_router.enabled():
+                for store in app.config['STORES']:
+                    if store != app.config['DEFAULT_STORE']:
+                        shard_router.engine(store)
             
             # Create default admin user if not exists
             try:
@@ -107,9 +159,63 @@ else:
             pass
 
 
+def public_pages_changed(*tags):
+    """Drop cached public pages with these tags and re-export the static snapshot"""
+    page_cache.invalidate(*tags)
+    static_snapshot.schedule()
+
+
+def catalog_changed(product_ids=None):
+    """Refresh in-process catalog caches after products were written.
+
+    ``product_ids`` limits the refresh to the touched products where a cache
+    supports it; ``None`` means the whole catalog may have changed.
+    """
+    barcode_index.invalidate()
+    product_search.invalidate()
+    public_pages_changed('products')
+    if product_ids is None:
+        low_stock.invalidate()
+    else:
+        low_stock.refresh(product_ids)
+
+
+def check_barcode(barcode, product_id=None):
+    """Error message if a barcode cannot be assigned to the product, else None"""
+    if barcode is None:
+        return None
+    if len(barcode) > 100:
+        return 'Barcode is longer than 100 characters'
+    owner = barcode_index.lookup(barcode)
+    if owner and owner['id'] != product_id:
+        return f"Barcode {barcode} is already assigned to {owner['name']}"
+    return None
+
+
+def barcode_conflict(barcode, product_id=None):
+    """Roll back a commit that failed on the unique barcode; the error message, or None for other failures"""
+    db.session.rollback()
+    # Another worker assigned the barcode after this process loaded its index
+    barcode_index.invalidate()
+    return check_barcode(barcode, product_id)
+
+
+def price_cart(cart):
+    """Offer discounts for the session cart, keyed by product id"""
+    products = load_products(cart.keys())
+    items = [(products[int(product_id)], item['quantity'], item['price'])
+             for product_id, item in cart.items() if int(product_id) in products]
+    return {
+        str(product.id): {'offer': line.title, 'discount': line.amount}
+        for (product, _, _), line in zip(items, promotions.price(items)) if line
+    }
+
+
 # ==================== Public Routes ====================
 
 @app.route('/')
+@cached_page(tags=('products', 'offers', 'settings'), ttl=app.config['PAGE_CACHE_TTL'])
+@read_only
 def home():
     """Home page - public"""
     # Get popular snacks (top 6 by order count)
@@ -136,23 +242,16 @@ def home():
 
 
 @app.route('/menu')
+@cached_page(tags=('products',), args={'category': 'all', 'search': ''}, ttl=app.config['PAGE_CACHE_TTL'])
+@read_only
 def menu():
     """Menu page - public"""
-    category = request.args.get('category', 'all')
-    search = request.args.get('search', '')
-    
-    query = Product.query.filter_by(is_available=True)
-    
-    if category != 'all':
-        query = query.filter_by(category=category)
-    
-    if search:
-        query = query.filter(Product.name.ilike(f'%{search}%'))
+    category = request.args.get('category', 'all').strip() or 'all'
+    search = ' '.join(request.args.get('search', '').split())
     
-    products = query.order_by(Product.name).all()
-    
-    categories = db.session.query(Product.category).distinct().all()
-    categories = [c[0] for c in categories]
+    # Ranked full-text search (falls back to a name LIKE filter without FTS5)
+    products = fetch(product_rows(MENU_COLUMNS, category, search))
+    categories = product_categories()
     
     return render_template('menu.html', products=products, categories=categories, 
                          current_category=category, search_query=search)
@@ -173,6 +272,7 @@ def login():
             session['user_id'] = user.id
             session['username'] = user.username
             session['role'] = user.role
+            session['store_id'] = user.store_id or app.config['DEFAULT_STORE']
             session.permanent = True
             
             next_page = request.args.get('next')
@@ -203,9 +303,8 @@ def logout():
 @login_required
 def billing():
     """Billing/POS page"""
-    products = Product.query.filter_by(is_available=True).order_by(Product.name).all()
-    categories = db.session.query(Product.category).distinct().all()
-    categories = [c[0] for c in categories]
+    products = fetch(product_rows(CARD_COLUMNS))
+    categories = product_categories()
     
     return render_template('billing.html', products=products, categories=categories)
 
@@ -216,26 +315,58 @@ def api_products():
     """API endpoint to get products"""
     category = request.args.get('category', 'all')
     search = request.args.get('search', '')
+    barcode = request.args.get('barcode', '').strip()
     
-    query = Product.query.filter_by(is_available=True)
-    
-    if category != 'all':
-        query = query.filter_by(category=category)
-    
-    if search:
-        query = query.filter(Product.name.ilike(f'%{search}%'))
+    # Barcode scans resolve through the in-memory barcode map
+    if barcode:
+        product = barcode_index.lookup(barcode)
+        return jsonify([product] if product and product['is_available'] else [])
     
-    products = query.order_by(Product.name).all()
+    # Ranked full-text search (falls back to a name LIKE filter without FTS5)
+    products = fetch(product_rows(CARD_COLUMNS, category, search))
     
     return jsonify([{
         'id': p.id,
         'name': p.name,
         'category': p.category,
         'price': p.price,
-        'image_url': p.image_url or ''
+        'image_url': p.image_url or '',
+        'barcode': p.barcode
     } for p in products])
 
 
+@app.route('/api/catalog/sync')
+@login_required
+@read_only
+def api_catalog_sync():
+    """Catalog changes since a terminal's watermark (full catalog without one)"""
+    since = parse_watermark(request.args.get('since'))
+    return jsonify(catalog_delta(since, app.config['CATALOG_SYNC_OVERLAP_SECONDS']))
+
+
+@app.route('/api/barcode/lookup', methods=['GET', 'POST'])
+@login_required
+def api_barcode_lookup():
+    """Resolve one barcode (GET ?code=) or a batch of scans (POST {"codes": [...]})"""
+    if request.method == 'GET':
+        code = request.args.get('code', '').strip()
+        if not code:
+            return jsonify({'error': 'code is required'}), 400
+        product = barcode_index.lookup(code)
+        if product is None:
+            return jsonify({'error': 'Product not found'}), 404
+        return jsonify(product)
+    
+    data = request.json or {}
+    codes = data.get('codes')
+    if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+        return jsonify({'error': 'codes must be a list of strings'}), 400
+    if len(codes) > app.config['BARCODE_LOOKUP_MAX_BATCH']:
+        return jsonify({'error': f"At most {app.config['BARCODE_LOOKUP_MAX_BATCH']} codes per lookup"}), 400
+    
+    return jsonify({'results': barcode_index.lookup_many(code.strip() for code in codes)})
+
+
 @app.route('/api/cart/add', methods=['POST'])
 @login_required
 def api_cart_add():
@@ -265,7 +396,7 @@ def api_cart_add():
     session['cart'] = cart
     session.modified = True
     
-    return jsonify({'success': True, 'cart': cart})
+    return jsonify({'success': True, 'cart': cart, 'promotions': price_cart(cart)})
 
 
 @app.route('/api/cart/update', methods=['POST'])
@@ -294,7 +425,7 @@ def api_cart_update():
     session['cart'] = cart
     session.modified = True
     
-    return jsonify({'success': True, 'cart': cart})
+    return jsonify({'success': True, 'cart': cart, 'promotions': price_cart(cart)})
 
 
 @app.route('/api/cart/remove', methods=['POST'])
@@ -315,7 +446,7 @@ def api_cart_remove():
     session['cart'] = cart
     session.modified = True
     
-    return jsonify({'success': True, 'cart': cart})
+    return jsonify({'success': True, 'cart': cart, 'promotions': price_cart(cart)})
 
 
 @app.route('/api/cart/clear', methods=['POST'])
@@ -332,7 +463,7 @@ def api_cart_clear():
 def api_cart():
     """Get current cart"""
     cart = session.get('cart', {})
-    return jsonify({'cart': cart})
+    return jsonify({'cart': cart, 'promotions': price_cart(cart)})
 
 
 @app.route('/api/order/process', methods=['POST'])
@@ -340,66 +471,62 @@ def api_cart():
 def api_order_process():
     """Process order and generate invoice"""
     try:
-        data = request.json
+        data = request.json or {}
         cart = session.get('cart', {})
 
+        # A retried or double-clicked checkout returns the order already created
+        idempotency_key = data.get('idempotency_key') or None
+        if idempotency_key:
+            existing = find_orders_by_keys([idempotency_key]).get(idempotency_key)
+            if existing:
+                session['cart'] = {}
+                session.modified = True
+                return jsonify({
+                    'success': True,
+                    'order_id': existing[0],
+                    'invoice_number': existing[1]
+                })
+
         if not cart:
             return jsonify({'error': 'Cart is empty'}), 400
 
-        # Get customer details and discount
-        customer_name = data.get('customer_name', '')
-        customer_phone = data.get('customer_phone', '')
-        discount = float(data.get('discount', 0))
-
-        # Get tax rate from settings
-        tax_setting = Setting.query.filter_by(key='tax_rate').first()
-        tax_rate = float(tax_setting.value) if tax_setting else 5.0
-
-        # Calculate totals
-        subtotal = sum(item['price'] * item['quantity'] for item in cart.values())
-        tax_amount = (subtotal * tax_rate) / 100
-        discount_amount = min(discount, subtotal)
-        total_amount = subtotal + tax_amount - discount_amount
-
-        # Generate invoice number
-        invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-
-        # Create order
-        order = Order(
-            invoice_number=invoice_number,
-            customer_name=customer_name,
-            customer_phone=customer_phone,
-            subtotal=subtotal,
-            tax_amount=tax_amount,
-            discount_amount=discount_amount,
-            total_amount=total_amount,
-            created_by=session['user_id']
-        )
-
-        db.session.add(order)
-        db.session.flush()
-
-        # Create order items and update inventory
-        for product_id_str, item in cart.items():
-            product_id = int(product_id_str)
-            product = Product.query.get(product_id)
-
-            if product.stock_quantity < item['quantity']:
-                db.session.rollback()
-                return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
-
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=product_id,
-                quantity=item['quantity'],
-                unit_price=item['price'],
-                total_price=item['price'] * item['quantity']
-            )
-            db.session.add(order_item)
-            
-            # Inventory update removed (stock management disabled)
+        lines = [{
+            'product_id': product_id,
+            'quantity': item['quantity'],
+            'price': item['price']
+        } for product_id, item in cart.items()]
 
-        db.session.commit()
+        use_writer = app.config['ORDER_WRITER_ENABLED']
+        try:
+            order = (build_order if use_writer else create_order)(
+                session['user_id'],
+                lines,
+                discount=data.get('discount', 0),
+                customer_name=data.get('customer_name', ''),
+                customer_phone=data.get('customer_phone', ''),
+                idempotency_key=idempotency_key
+            )
+            if use_writer:
+                # This session only read; release it before waiting on the writer
+                db.session.rollback()
+                order_id, invoice_number = order_writer.submit(order).result(
+                    timeout=app.config['ORDER_WRITER_TIMEOUT'])
+            else:
+                db.session.commit()
+                order_journal.record_orders(ORDER_CREATED, [order])
+                publish_orders([order])
+                order_id, invoice_number = order.id, order.invoice_number
+        except CheckoutError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+        except IntegrityError:
+            # A concurrent retry of the same checkout was committed first
+            db.session.rollback()
+            existing = find_orders_by_keys([idempotency_key]).get(idempotency_key) if idempotency_key else None
+            if not existing:
+                raise
+            order_id, invoice_number = existing
+        low_stock.refresh(cart.keys())
 
         # Clear cart
         session['cart'] = {}
@@ -407,7 +534,7 @@ def api_order_process():
 
         return jsonify({
             'success': True,
-            'order_id': order.id,
+            'order_id': order_id,
             'invoice_number': invoice_number
         })
     except Exception as e:
@@ -415,11 +542,72 @@ def api_order_process():
         return jsonify({'error': f'Error processing order: {str(e)}'}), 500
 
 
+@app.route('/api/orders/sync', methods=['POST'])
+@login_required
+def api_orders_sync():
+    """Upload orders queued by a terminal while it was offline"""
+    data = request.json or {}
+    payloads = data.get('orders')
+
+    if not isinstance(payloads, list):
+        return jsonify({'error': 'orders must be a list'}), 400
+    if len(payloads) > app.config['ORDER_SYNC_MAX_BATCH']:
+        return jsonify({'error': f"At most {app.config['ORDER_SYNC_MAX_BATCH']} orders per sync"}), 400
+
+    try:
+        results, created = sync_orders(session['user_id'], payloads)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error syncing orders: {str(e)}'}), 500
+
+    low_stock.refresh({item.product_id for order in created for item in order.items})
+    order_journal.record_orders(ORDER_CREATED, created)
+    publish_orders(created)
+
+    return jsonify({
+        'success': True,
+        'created': len(created),
+        'results': results
+    })
+
+
+@app.route('/api/customers/lookup')
+@login_required
+def api_customer_lookup():
+    """Find a repeat customer by phone number for the billing screen"""
+    customer = find_customer(request.args.get('phone', ''))
+    if customer is None:
+        return jsonify({'found': False})
+
+    orders = recent_orders(customer, app.config['CUSTOMER_RECENT_ORDERS'])
+    return jsonify({
+        'found': True,
+        'customer': {
+            'id': customer.id,
+            'phone': customer.phone,
+            'name': customer.name,
+            'visit_count': customer.visit_count,
+            'lifetime_spend': round(customer.lifetime_spend, 2),
+            'first_visit': customer.first_visit.isoformat() if customer.first_visit else None,
+            'last_visit': customer.last_visit.isoformat() if customer.last_visit else None
+        },
+        'recent_orders': [{
+            'id': order.id,
+            'invoice_number': order.invoice_number,
+            'total_amount': order.total_amount,
+            'created_at': order.created_at.isoformat()
+        } for order in orders]
+    })
+
+
 @app.route('/invoice/<int:order_id>/pdf')
 @login_required
+@read_only
 def invoice_pdf(order_id):
     """Generate and download PDF invoice"""
-    order = Order.query.get_or_404(order_id)
+    order = get_order(order_id)
+    if order is None:
+        abort(404)
     
     # Check if user has permission (admin or creator)
     if not get_current_user().is_admin() and order.created_by != session['user_id']:
@@ -439,6 +627,7 @@ def invoice_pdf(order_id):
 
 @app.route('/orders')
 @login_required
+@read_only
 def orders():
     """Orders history page"""
     period = request.args.get('period', 'today')
@@ -459,17 +648,9 @@ def orders():
         start_date = None
         end_date = None
     
-    # Query orders
-    query = Order.query
-    
-    # Filter by user if not admin
-    if not get_current_user().is_admin():
-        query = query.filter_by(created_by=session['user_id'])
-    
-    if start_date and end_date:
-        query = query.filter(Order.created_at >= start_date, Order.created_at <= end_date)
-    
-    orders_list = query.order_by(Order.created_at.desc()).all()
+    # Query orders (archived months are only read when the period reaches them)
+    created_by = None if get_current_user().is_admin() else session['user_id']
+    orders_list = query_orders(start_date, end_date, created_by=created_by)
     
     # Calculate summary
     total_sales = sum(order.total_amount for order in orders_list)
@@ -481,9 +662,12 @@ def orders():
 
 @app.route('/orders/<int:order_id>')
 @login_required
+@read_only
 def order_detail(order_id):
     """Order details page"""
-    order = Order.query.get_or_404(order_id)
+    order = get_order(order_id)
+    if order is None:
+        abort(404)
     
     # Check permission
     if not get_current_user().is_admin() and order.created_by != session['user_id']:
@@ -498,11 +682,20 @@ def order_delete(order_id):
     """Delete order"""
     order = Order.query.get_or_404(order_id)
     
+    # Closed days are frozen in their Z-report
+    if is_day_closed(order.created_at.date()):
+        return jsonify({'error': 'This order belongs to a closed day and cannot be deleted'}), 400
+    
+    # Journaled after the commit; the snapshot is taken while the items still exist
+    snapshot = dict(order_snapshot(order), deleted_by=session['user_id'])
+    
     try:
-        # Delete order items (cascade should handle this, but being explicit)
-        OrderItem.query.filter_by(order_id=order_id).delete()
+        # The snapshot loaded the items, so the delete-orphan cascade removes them
+        release_order(order)
         db.session.delete(order)
         db.session.commit()
+        order_journal.record(ORDER_DELETED, snapshot)
+        dashboard_counters.invalidate()
         
         return jsonify({'success': True})
     except Exception as e:
@@ -514,54 +707,194 @@ def order_delete(order_id):
 
 @app.route('/admin/dashboard')
 @admin_required
+@read_only
 def admin_dashboard():
     """Admin dashboard"""
     # Get statistics
     total_products = Product.query.count()
     
-    # Sales statistics
-    today = datetime.now().date()
-    start_date = datetime.combine(today, datetime.min.time())
-    end_date = datetime.combine(today, datetime.max.time())
-    
-    today_orders = Order.query.filter(
-        Order.created_at >= start_date,
-        Order.created_at <= end_date
-    ).all()
-    
-    today_sales = sum(order.total_amount for order in today_orders)
-    
-    # Top selling items
-    top_items = db.session.query(
-        Product.name,
-        db.func.sum(OrderItem.quantity).label('total_sold')
-    ).join(OrderItem).join(Order).filter(
-        Order.created_at >= start_date,
-        Order.created_at <= end_date
-    ).group_by(Product.id).order_by(
-        db.desc('total_sold')
-    ).limit(5).all()
+    # Read from the database: orders may have been committed by other workers
+    counters = today_stats()
     
     # Recent orders
     recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
     
     return render_template('admin/dashboard.html',
                          total_products=total_products,
-                         today_sales=today_sales,
-                         today_orders_count=len(today_orders),
-                         top_items=top_items,
-                         recent_orders=recent_orders)
+                         today_sales=counters['today_sales'],
+                         today_orders_count=counters['today_orders_count'],
+                         top_items=counters['top_items'],
+                         recent_orders=recent_orders,
+                         low_stock_count=low_stock.count(),
+                         stores=app.config['STORES'],
+                         current_store=current_store())
+
+
+@app.route('/admin/store', methods=['POST'])
+@admin_required
+def admin_switch_store():
+    """Switch the store the admin is working on"""
+    store = request.form.get('store_id')
+    if store in app.config['STORES']:
+        session['store_id'] = store
+    return redirect(request.referrer or url_for('admin_dashboard'))
+
+
+@app.route('/admin/head-office')
+@admin_required
+def admin_head_office():
+    """Sales of every store side by side, queried from all shards in parallel"""
+    today = datetime.now().date()
+    try:
+        end_day = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        end_day = today
+    try:
+        start_day = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+    except ValueError:
+        start_day = end_day - timedelta(days=6)
+    if start_day > end_day:
+        start_day, end_day = end_day, start_day
+    
+    report = chain_sales(start_day, end_day)
+    return render_template('admin/head_office.html', report=report,
+                         start_day=start_day, end_day=end_day)
+
+
+@app.route('/admin/events')
+@admin_required
+def admin_events():
+    """Server-Sent Events feed of new orders and dashboard counters"""
+    initial = today_stats()
+    subscriber = broker.subscribe(current_store())
+    return Response(
+        stream_events(subscriber, initial, app.config['EVENT_STREAM_HEARTBEAT']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/admin/db/routing')
+@admin_required
+def admin_db_routing():
+    """Primary/read-bind routing decisions per endpoint"""
+    return jsonify(replica_router.stats())
+
+
+@app.route('/admin/order-writer/stats')
+@admin_required
+def admin_order_writer_stats():
+    """Group-commit checkout writer statistics"""
+    return jsonify(dict(order_writer.stats(), enabled=app.config['ORDER_WRITER_ENABLED']))
+
+
+@app.route('/api/journal')
+@admin_required
+def api_journal():
+    """Order events after a sequence number, for consumers tailing the journal"""
+    after = request.args.get('after', 0, type=int)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), app.config['JOURNAL_TAIL_MAX'])
+    events = tail_journal(after, limit, request.args.get('type') or None, request.args.get('store') or None)
+    return jsonify({
+        'events': events,
+        # Resume from here; unchanged when there is nothing new yet
+        'next_after': events[-1]['seq'] if events else after,
+        'writer': order_journal.stats()
+    })
+
+
+@app.route('/admin/cache/stats')
+@admin_required
+def admin_cache_stats():
+    """Hit/miss counters of the rendered page cache, and the static snapshot state"""
+    return jsonify(dict(page_cache.stats(), snapshot=static_snapshot.stats()))
+
+
+@app.route('/api/alerts/low-stock')
+@admin_required
+@read_only
+def api_low_stock_alerts():
+    """API endpoint for low-stock alerts (served from the low-stock index)"""
+    items = low_stock.items()
+    return jsonify({
+        'threshold': low_stock.threshold,
+        'count': len(items),
+        'products': items
+    })
+
+
+@app.route('/admin/reports')
+@admin_required
+@read_only
+def admin_reports():
+    """Sales report over a date range, using frozen summaries for closed days"""
+    today = datetime.now().date()
+    try:
+        end_day = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        end_day = today
+    try:
+        start_day = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+    except ValueError:
+        start_day = end_day - timedelta(days=6)
+    if start_day > end_day:
+        start_day, end_day = end_day, start_day
+    
+    report = sales_report(start_day, end_day)
+    return render_template('admin/reports.html', report=report,
+                         start_day=start_day, end_day=end_day, today=today)
+
+
+@app.route('/admin/reports/close-day', methods=['POST'])
+@admin_required
+def admin_reports_close_day():
+    """Close a business day and freeze its Z-report"""
+    try:
+        day = datetime.strptime(request.form.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = datetime.now().date() - timedelta(days=1)
+    
+    try:
+        close_day(day, session['user_id'])
+    except ReportError as e:
+        db.session.rollback()
+        flash(str(e))
+    else:
+        flash(f'Day {day.isoformat()} closed')
+    
+    return redirect(url_for('admin_reports', start=request.form.get('start'), end=request.form.get('end')))
+
+
+@app.route('/admin/forecast')
+@admin_required
+@read_only
+def admin_forecast():
+    """Demand forecast and suggested reorder quantities per product"""
+    return render_template('admin/forecast.html', forecast=demand_forecaster.get())
+
+
+@app.route('/admin/forecast/refresh', methods=['POST'])
+@admin_required
+def admin_forecast_refresh():
+    """Recompute today's forecast, e.g. after stock was counted"""
+    demand_forecaster.invalidate()
+    return redirect(url_for('admin_forecast'))
 
 
 @app.route('/admin/products')
 @admin_required
 def admin_products():
     """Product management page"""
-    products = Product.query.order_by(Product.name).all()
-    categories = db.session.query(Product.category).distinct().all()
-    categories = [c[0] for c in categories]
+    category = request.args.get('category', 'all').strip() or 'all'
+    search = ' '.join(request.args.get('search', '').split())
+    page = request.args.get('page', 1, type=int)
     
-    return render_template('admin/products.html', products=products, categories=categories)
+    listing = paginate(product_rows(ADMIN_COLUMNS, category, search, available_only=False),
+                       page, app.config['ADMIN_PRODUCTS_PER_PAGE'])
+    categories = product_categories()
+    
+    return render_template('admin/products.html', products=listing['items'], listing=listing,
+                         categories=categories, current_category=category, search_query=search)
 
 
 @app.route('/admin/products/add', methods=['POST'])
@@ -572,6 +905,12 @@ def admin_products_add():
     category = request.form.get('category')
     price = float(request.form.get('price', 0))
     description = request.form.get('description', '')
+    barcode = request.form.get('barcode', '').strip() or None
+    
+    error = check_barcode(barcode)
+    if error:
+        flash(error)
+        return redirect(url_for('admin_products'))
     
     # Handle image upload
     image_url = None
@@ -601,13 +940,21 @@ def admin_products_add():
         price=price,
         stock_quantity=999,  # Set high default since stock is removed
         description=description,
-        barcode=None,  # Barcode removed
+        barcode=barcode,
         image_url=image_url,
         is_available=True
     )
     
     db.session.add(product)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        error = barcode_conflict(barcode)
+        if not error:
+            raise
+        flash(error)
+        return redirect(url_for('admin_products'))
+    catalog_changed([product.id])
     
     return redirect(url_for('admin_products'))
 
@@ -617,13 +964,19 @@ def admin_products_add():
 def admin_products_edit(product_id):
     """Edit product"""
     product = Product.query.get_or_404(product_id)
+    barcode = request.form.get('barcode', '').strip() or None
+    
+    error = check_barcode(barcode, product_id)
+    if error:
+        flash(error)
+        return redirect(url_for('admin_products'))
     
     product.name = request.form.get('name')
     product.category = request.form.get('category')
     product.price = float(request.form.get('price', 0))
     product.stock_quantity = 999  # Stock removed, set high default
     product.description = request.form.get('description', '')
-    product.barcode = None  # Barcode removed
+    product.barcode = barcode
     product.is_available = True  # Always available since stock is removed
     product.updated_at = datetime.utcnow()
     
@@ -645,7 +998,15 @@ def admin_products_edit(product_id):
             file.save(filepath)
             product.image_url = filename
     
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        error = barcode_conflict(barcode, product_id)
+        if not error:
+            raise
+        flash(error)
+        return redirect(url_for('admin_products'))
+    catalog_changed([product_id])
     
     return redirect(url_for('admin_products'))
 
@@ -656,17 +1017,129 @@ def admin_products_delete(product_id):
     """Delete product"""
     product = Product.query.get_or_404(product_id)
     db.session.delete(product)
+    db.session.add(ProductTombstone(product_id=product_id))
     db.session.commit()
+    catalog_changed([product_id])
     
     return redirect(url_for('admin_products'))
 
 
+@app.route('/admin/products/import', methods=['POST'])
+@admin_required
+def admin_products_import():
+    """Bulk import products from a CSV, JSON Lines or JSON array upload"""
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    try:
+        fmt = detect_format(file.filename, request.form.get('format'))
+        report = import_products(iter_rows(file.stream, fmt))
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Could not read file: {str(e)}'}), 400
+    finally:
+        catalog_changed()
+    
+    if 'format_error' in report:
+        return jsonify(dict(report, error=(
+            f"Could not read file: {report['format_error']}. The rows before it were imported "
+            f"({report['inserted']} new, {report['updated']} updated)"))), 400
+    return jsonify(dict(report, success=True))
+
+
+@app.route('/admin/products/export')
+@admin_required
+@read_only
+def admin_products_export():
+    """Stream the product catalog as CSV, JSON Lines or JSON"""
+    try:
+        fmt = detect_format(None, request.args.get('format', 'csv'))
+    except ImportFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    mimetypes = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'json': 'application/json'}
+    filename = f"products_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(export_products(fmt)),
+        mimetype=mimetypes[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@app.route('/admin/products/labels', methods=['POST'])
+@admin_required
+def admin_products_labels():
+    """Printable barcode label sheet (PDF, or one PNG page) for a product selection"""
+    fmt = request.form.get('format', 'pdf')
+    if fmt not in ('pdf', 'png'):
+        return jsonify({'error': 'format must be pdf or png'}), 400
+    max_labels = app.config['LABEL_MAX_LABELS']
+    copies = max(request.form.get('copies', 1, type=int) or 1, 1)
+    if copies > max_labels:
+        return jsonify({'error': f'At most {max_labels} labels per sheet'}), 400
+    
+    stmt = product_rows((Product.id, Product.name, Product.price, Product.barcode),
+                        request.form.get('category', 'all'), request.form.get('search', ''),
+                        available_only=False)
+    ids = [int(pid) for pid in request.form.get('ids', '').split(',') if pid.strip().isdigit()]
+    if ids:
+        stmt = stmt.where(Product.id.in_(ids))
+    rows = fetch(stmt)
+    
+    # Products without a barcode get an in-store EAN-13 on request, else they are skipped
+    assign_missing = request.form.get('assign_missing') == 'on'
+    printable = sum(1 for row in rows if row.barcode or assign_missing)
+    if printable * copies > max_labels:
+        # Checked before anything is assigned or built
+        return jsonify({'error': f'At most {max_labels} labels per sheet'}), 400
+    unassigned = [row.id for row in rows if not row.barcode]
+    assigned = {}
+    if unassigned and assign_missing:
+        assigned = {pid: internal_barcode(pid) for pid in unassigned}
+        now = datetime.utcnow()
+        try:
+            db.session.execute(db.update(Product), [
+                {'id': pid, 'barcode': code, 'updated_at': now} for pid, code in assigned.items()])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'An in-store barcode is already used by another product'}), 400
+        catalog_changed(assigned.keys())
+    
+    labels = [{'name': row.name, 'price': row.price, 'barcode': row.barcode or assigned[row.id]}
+              for row in rows if row.barcode or row.id in assigned for _ in range(copies)]
+    if not labels:
+        return jsonify({'error': 'No products with a barcode in the selection'}), 400
+    
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if fmt == 'png':
+        pages = (len(labels) + LABELS_PER_SHEET - 1) // LABELS_PER_SHEET
+        page = min(max(request.form.get('page', 1, type=int) or 1, 1), pages)
+        response = send_file(label_renderer.png(labels, page), mimetype='image/png',
+                             as_attachment=True, download_name=f'labels_{stamp}_page{page}.png')
+        response.headers['X-Label-Pages'] = str(pages)
+        return response
+    return send_file(label_renderer.pdf(labels), mimetype='application/pdf',
+                     as_attachment=True, download_name=f'labels_{stamp}.pdf')
+
+
+@app.route('/admin/labels/stats')
+@admin_required
+def admin_labels_stats():
+    """Symbol cache and render pool counters of the label sheet renderer"""
+    return jsonify(label_renderer.stats())
+
+
 @app.route('/admin/offers')
 @admin_required
 def admin_offers():
     """Manage offers page"""
     offers = Offer.query.order_by(Offer.display_order, Offer.id).all()
-    return render_template('admin/offers.html', offers=offers)
+    categories = [c[0] for c in db.session.query(Product.category).distinct().order_by(Product.category)]
+    products = db.session.query(Product.id, Product.name).order_by(Product.name).all()
+    return render_template('admin/offers.html', offers=offers, categories=categories,
+                           products=products, rule_types=RULE_TYPES)
 
 
 @app.route('/admin/offers/add', methods=['POST'])
@@ -677,16 +1150,24 @@ def admin_offers_add():
     description = request.form.get('description')
     display_order = int(request.form.get('display_order', 0))
     is_active = request.form.get('is_active') == 'on'
+    try:
+        rule = parse_rule(request.form)
+    except PromotionError as e:
+        flash(str(e))
+        return redirect(url_for('admin_offers'))
     
     offer = Offer(
         title=title,
         description=description,
         display_order=display_order,
-        is_active=is_active
+        is_active=is_active,
+        **rule
     )
     
     db.session.add(offer)
     db.session.commit()
+    public_pages_changed('offers')
+    promotions.invalidate()
     
     return redirect(url_for('admin_offers'))
 
@@ -696,14 +1177,23 @@ def admin_offers_add():
 def admin_offers_edit(offer_id):
     """Edit offer"""
     offer = Offer.query.get_or_404(offer_id)
+    try:
+        rule = parse_rule(request.form)
+    except PromotionError as e:
+        flash(str(e))
+        return redirect(url_for('admin_offers'))
     
     offer.title = request.form.get('title')
     offer.description = request.form.get('description')
     offer.display_order = int(request.form.get('display_order', 0))
     offer.is_active = request.form.get('is_active') == 'on'
+    for name, value in rule.items():
+        setattr(offer, name, value)
     offer.updated_at = datetime.utcnow()
     
     db.session.commit()
+    public_pages_changed('offers')
+    promotions.invalidate()
     
     return redirect(url_for('admin_offers'))
 
@@ -715,6 +1205,8 @@ def admin_offers_delete(offer_id):
     offer = Offer.query.get_or_404(offer_id)
     db.session.delete(offer)
     db.session.commit()
+    public_pages_changed('offers')
+    promotions.invalidate()
     
     return redirect(url_for('admin_offers'))
 
@@ -790,9 +1282,117 @@ def admin_settings_update():
             db.session.add(setting)
     
     db.session.commit()
+    low_stock.invalidate()
+    public_pages_changed('settings')
     return redirect(url_for('admin_settings'))
 
 
+
+# ==================== CLI Commands ====================
+
+def _command_stores(store):
+    """Stores a CLI command runs for: the given one, or all of them"""
+    if store is None:
+        return app.config['STORES']
+    if store not in app.config['STORES']:
+        raise click.BadParameter(f'unknown store {store!r}', param_hint='--store')
+    return [store]
+
+
+@app.cli.command('archive-orders')
+@click.option('--keep-months', default=None, type=int,
+              help='Number of recent months to keep in the hot tables (default: ARCHIVE_KEEP_MONTHS)')
+@click.option('--store', default=None, help='Store to archive (default: all stores)')
+def archive_orders_command(keep_months, store):
+    """Move orders from closed months to the archive tables"""
+    keep_months = keep_months or app.config['ARCHIVE_KEEP_MONTHS']
+    for store_id in _command_stores(store):
+        with use_store(store_id):
+            try:
+                archived = archive_closed_months(keep_months)
+            except ArchiveError as e:
+                db.session.rollback()
+                raise click.ClickException(f'{store_id}: {e}')
+        
+        if not archived:
+            click.echo(f'{store_id}: nothing to archive.')
+        for month, count in archived:
+            click.echo(f'{store_id}: {month}: archived {count} orders')
+
+
+
+@app.cli.command('close-day')
+@click.option('--date', 'day', default=None, help='Business day to close as YYYY-MM-DD (default: yesterday)')
+@click.option('--store', default=None, help='Store to close (default: all stores)')
+def close_day_command(day, store):
+    """Close a business day and freeze its Z-report"""
+    try:
+        day = datetime.strptime(day, '%Y-%m-%d').date() if day else datetime.now().date() - timedelta(days=1)
+    except ValueError:
+        raise click.BadParameter('use YYYY-MM-DD', param_hint='--date')
+    
+    for store_id in _command_stores(store):
+        with use_store(store_id):
+            try:
+                summary = close_day(day)
+            except ReportError as e:
+                db.session.rollback()
+                raise click.ClickException(f'{store_id}: {e}')
+        
+        click.echo(f'{store_id}: {day.isoformat()}: {summary.order_count} orders, '
+                   f'total {summary.total_amount:.2f}')
+
+
+@app.cli.command('assign-store')
+@click.argument('username')
+@click.argument('store')
+def assign_store_command(username, store):
+    """Set the home store of a user account"""
+    _command_stores(store)
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user named {username!r}')
+    user.store_id = store
+    db.session.commit()
+    click.echo(f'{username} now works at {store}')
+
+
+@app.cli.command('export-snapshot')
+def export_snapshot_command():
+    """Render the public pages to the static snapshot"""
+    files = static_snapshot.export()
+    click.echo(f'Wrote {len(files)} files to {static_snapshot.directory()}')
+
+
+@app.cli.command('tail-journal')
+@click.option('--after', default=0, type=int, help='Print events after this sequence number')
+@click.option('--limit', default=1000, type=int, help='Events to fetch per query')
+@click.option('--follow', is_flag=True, help='Keep polling for new events')
+def tail_journal_command(after, limit, follow):
+    """Print order events as JSON Lines, oldest first"""
+    while True:
+        events = tail_journal(after, limit)
+        for event in events:
+            click.echo(json.dumps(event))
+        if events:
+            after = events[-1]['seq']
+            continue
+        if not follow:
+            break
+        db.session.rollback()  # end the read transaction so new events become visible
+        time.sleep(1)
+
+
+@app.cli.command('backfill-customers')
+@click.option('--store', default=None, help='Store whose orders to link (default: all stores)')
+def backfill_customers_command(store):
+    """Link existing orders to the customer ledger by phone number"""
+    for store_id in _command_stores(store):
+        with use_store(store_id):
+            linked = backfill_customers()
+        click.echo(f'{store_id}: linked {linked} orders')
+
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -0,0 +1,146 @@
+"""
+Hot/cold order storage: closed months move to the archive tables
+"""
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select
+from models import db, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, ArchivedMonth
+from stores import current_store
+
+ORDER_COLUMNS = [c.name for c in Order.__table__.columns]
+ITEM_COLUMNS = [c.name for c in OrderItem.__table__.columns]
+
+
+class ArchiveError(Exception):
+    """Raised when a month cannot be archived"""
+
+
+def month_start(year, month):
+    return datetime(year, month, 1)
+
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def month_key(year, month):
+    return f'{year:04d}-{month:02d}'
+
+
+def archive_horizon():
+    """End of the newest archived month of the current store, or None.
+
+    Reads only need the archive tables when their range starts before this
+    point, which keeps most queries on the small hot tables. It is read on
+    every call (one lookup on the unique ``month`` index), so a web worker
+    sees months archived by the CLI at once.
+    """
+    newest = db.session.query(func.max(ArchivedMonth.month)).scalar()
+    if not newest:
+        return None
+    year, month = (int(part) for part in newest.split('-'))
+    return month_start(*next_month(year, month))
+
+
+def needs_archive(start_date):
+    """Whether a range starting at ``start_date`` (None = unbounded) reaches archived data"""
+    until = archive_horizon()
+    return until is not None and (start_date is None or start_date < until)
+
+
+# ==================== Archiving ====================
+
+def archive_month(year, month):
+    """Move one closed month of orders and their items to the archive tables.
+
+    Runs in a single transaction; returns the number of orders moved.
+    """
+    now = datetime.now()
+    if (year, month) >= (now.year, now.month):
+        raise ArchiveError('Only months that have ended can be archived')
+
+    start = month_start(year, month)
+    end = month_start(*next_month(year, month))
+    in_month = (Order.created_at >= start) & (Order.created_at < end)
+    order_ids = select(Order.id).where(in_month)
+
+    count = db.session.query(func.count(Order.id)).filter(in_month).scalar()
+    if count:
+        # SQLite reuses the highest rowid once it is deleted, which would give
+        # a new order the id of an archived one.
+        newest_id = db.session.query(func.max(Order.id)).scalar()
+        if db.session.query(Order.id).filter(in_month, Order.id == newest_id).first():
+            raise ArchiveError('The newest order must stay in the hot table')
+
+        db.session.execute(insert(ArchivedOrder).from_select(
+            ORDER_COLUMNS,
+            select(*[Order.__table__.c[name] for name in ORDER_COLUMNS]).where(in_month)
+        ))
+        db.session.execute(insert(ArchivedOrderItem).from_select(
+            ITEM_COLUMNS,
+            select(*[OrderItem.__table__.c[name] for name in ITEM_COLUMNS]).where(
+                OrderItem.order_id.in_(order_ids))
+        ))
+        db.session.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+        db.session.execute(delete(Order).where(in_month))
+
+    key = month_key(year, month)
+    record = ArchivedMonth.query.filter_by(month=key).first()
+    if record:
+        record.order_count += count
+        record.archived_at = datetime.utcnow()
+    else:
+        db.session.add(ArchivedMonth(month=key, order_count=count))
+
+    db.session.commit()
+    return count
+
+
+def archive_closed_months(keep_months):
+    """Archive every month older than the newest ``keep_months`` months.
+
+    Returns ``[(YYYY-MM, orders moved), ...]``.
+    """
+    oldest = db.session.query(func.min(Order.created_at)).scalar()
+    if oldest is None:
+        return []
+
+    now = datetime.now()
+    cutoff_year, cutoff_month = now.year, now.month
+    for _ in range(max(keep_months, 1) - 1):
+        cutoff_year, cutoff_month = (cutoff_year - 1, 12) if cutoff_month == 1 else (cutoff_year, cutoff_month - 1)
+
+    archived = []
+    year, month = oldest.year, oldest.month
+    while (year, month) < (cutoff_year, cutoff_month):
+        archived.append((month_key(year, month), archive_month(year, month)))
+        year, month = next_month(year, month)
+    return archived
+
+
+# ==================== Reads ====================
+
+def query_orders(start_date=None, end_date=None, created_by=None):
+    """Orders in a date range, newest first, reading the archive only when needed"""
+    models = [Order]
+    if needs_archive(start_date):
+        models.append(ArchivedOrder)
+
+    results = []
+    for model in models:
+        query = model.query
+        if created_by is not None:
+            query = query.filter(model.created_by == created_by)
+        if start_date is not None:
+            query = query.filter(model.created_at >= start_date)
+        if end_date is not None:
+            query = query.filter(model.created_at <= end_date)
+        results.extend(query.order_by(model.created_at.desc()).all())
+
+    if len(models) > 1:
+        results.sort(key=lambda order: order.created_at, reverse=True)
+    return results
+
+
+def get_order(order_id):
+    """Look up an order by id in the hot table, then in the archive"""
+    return db.session.get(Order, order_id) or db.session.get(ArchivedOrder, order_id)
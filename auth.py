@@ -2,8 +2,11 @@
 Authentication utilities for the Snacks Shop application
 """
 from functools import wraps
-from flask import session, redirect, url_for, request
-from models import User
+from flask import session, redirect, url_for, request, g
+from models import db, User
+
+_UNRESOLVED = object()
+
 
 def login_required(f):
     """Decorator to require login for routes"""
@@ -19,18 +22,21 @@ def admin_required(f):
     @wraps(f)
     @login_required
     def decorated_function(*args, **kwargs):
-        user_id = session.get('user_id')
-        if user_id:
-            user = User.query.get(user_id)
-            if not user or not user.is_admin():
-                return redirect(url_for('billing'))
+        user = get_current_user()
+        if not user or not user.is_admin():
+            return redirect(url_for('billing'))
         return f(*args, **kwargs)
     return decorated_function
 
 def get_current_user():
-    """Get the current logged-in user"""
-    user_id = session.get('user_id')
-    if user_id:
-        return User.query.get(user_id)
-    return None
+    """Get the current logged-in user.
 
+    The user is loaded at most once per request and memoized on ``flask.g``,
+    so decorators and route bodies share a single lookup.
+    """
+    user = g.get('_current_user', _UNRESOLVED)
+    if user is _UNRESOLVED:
+        user_id = session.get('user_id')
+        user = db.session.get(User, user_id) if user_id else None
+        g._current_user = user
+    return user
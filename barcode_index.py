@@ -0,0 +1,60 @@
+"""
+In-memory barcode lookup for the Snacks Shop POS
+"""
+import threading
+from models import db, Product
+
+
+class BarcodeIndex:
+    """Process-local barcode -> product map.
+
+    Loaded with one query over the unique ``barcode`` index on first use and
+    dropped whenever products are edited, so scans are plain dict lookups.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._map = None
+
+    def _load(self):
+        rows = db.session.query(
+            Product.id, Product.name, Product.category, Product.price,
+            Product.image_url, Product.stock_quantity, Product.is_available,
+            Product.barcode
+        ).filter(Product.barcode.isnot(None)).all()
+        return {row.barcode: {
+            'id': row.id,
+            'name': row.name,
+            'category': row.category,
+            'price': row.price,
+            'image_url': row.image_url or '',
+            'stock': row.stock_quantity,
+            'is_available': row.is_available,
+            'barcode': row.barcode
+        } for row in rows}
+
+    def _get_map(self):
+        mapping = self._map
+        if mapping is None:
+            with self._lock:
+                if self._map is None:
+                    self._map = self._load()
+                mapping = self._map
+        return mapping
+
+    def lookup(self, code):
+        """Return the product dict for a barcode, or None"""
+        return self._get_map().get(code)
+
+    def lookup_many(self, codes):
+        """Resolve several barcodes at once; unknown codes map to None"""
+        mapping = self._get_map()
+        return {code: mapping.get(code) for code in codes}
+
+    def invalidate(self):
+        """Drop the map; the next lookup reloads it"""
+        with self._lock:
+            self._map = None
+
+
+barcode_index = BarcodeIndex()
@@ -0,0 +1,86 @@
+"""
+Checkout throughput benchmark: orders per second versus concurrent cashiers,
+with and without the group-commit order writer.
+
+Usage:
+    python bench_checkout.py [--cashiers 1,2,4,8,16] [--orders 50]
+
+Runs against a throwaway SQLite database; the real database is not touched.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_workdir = tempfile.mkdtemp(prefix='trio-bench-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'bench.db')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, init_db  # noqa: E402
+from models import db, User, Product  # noqa: E402
+
+
+def setup(cashiers):
+    init_db()
+    with app.app_context():
+        if not Product.query.filter_by(name='Bench Samosa').first():
+            db.session.add(Product(name='Bench Samosa', category='snacks', price=15.0,
+                                   stock_quantity=1000000, is_available=True))
+        for number in range(cashiers):
+            username = f'bench{number}'
+            if not User.query.filter_by(username=username).first():
+                user = User(username=username, role='cashier')
+                user.set_password('bench')
+                db.session.add(user)
+        db.session.commit()
+        return Product.query.filter_by(name='Bench Samosa').first().id
+
+
+def cashier(number, product_id, orders, failures, barrier):
+    client = app.test_client()
+    client.post('/login', data={'username': f'bench{number}', 'password': 'bench'})
+    barrier.wait()
+    for _ in range(orders):
+        client.post('/api/cart/add', json={'product_id': product_id, 'quantity': 1})
+        response = client.post('/api/order/process', json={})
+        if response.status_code != 200:
+            failures.append(response.get_json())
+
+
+def run(cashiers, orders, product_id, use_writer):
+    app.config['ORDER_WRITER_ENABLED'] = use_writer
+    failures = []
+    barrier = threading.Barrier(cashiers + 1)
+    threads = [threading.Thread(target=cashier, args=(n, product_id, orders, failures, barrier))
+               for n in range(cashiers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    completed = cashiers * orders - len(failures)
+    return completed / elapsed, len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cashiers', default='1,2,4,8,16',
+                        help='comma-separated numbers of concurrent cashiers')
+    parser.add_argument('--orders', type=int, default=50, help='orders per cashier')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.cashiers.split(',')]
+
+    product_id = setup(max(levels))
+    print(f'{"cashiers":>8}  {"direct orders/s":>15}  {"failed":>6}  {"writer orders/s":>15}  {"failed":>6}')
+    for level in levels:
+        direct, direct_failed = run(level, args.orders, product_id, use_writer=False)
+        grouped, grouped_failed = run(level, args.orders, product_id, use_writer=True)
+        print(f'{level:>8}  {direct:>15.1f}  {direct_failed:>6}  {grouped:>15.1f}  {grouped_failed:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Delta catalog sync for billing terminals
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from models import db, Product, ProductTombstone
+
+SYNC_COLUMNS = ['id', 'name', 'category', 'price', 'image_url', 'barcode']
+
+
+def parse_watermark(value):
+    """Parse a watermark previously returned by ``catalog_delta``; None when absent or invalid"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def catalog_delta(since=None, overlap_seconds=5):
+    """Products changed since a watermark, in a compact columnar layout.
+
+    Without a watermark the full available catalog is returned. With one,
+    only products whose ``updated_at`` moved past it are sent, and products
+    that were deleted or made unavailable are listed in ``deleted``. The
+    window is widened by ``overlap_seconds`` so a write committed just after
+    a sync is never missed; terminals apply rows idempotently.
+    """
+    columns = [getattr(Product, name) for name in SYNC_COLUMNS]
+    query = select(*columns, Product.is_available, Product.updated_at)
+    deleted = []
+    newest = since
+
+    if since is None:
+        query = query.where(Product.is_available.is_(True))
+    else:
+        window_start = since - timedelta(seconds=overlap_seconds)
+        query = query.where(Product.updated_at > window_start)
+        for product_id, deleted_at in db.session.execute(
+            select(ProductTombstone.product_id, ProductTombstone.deleted_at)
+            .where(ProductTombstone.deleted_at > window_start)
+        ):
+            deleted.append(product_id)
+            newest = max(newest, deleted_at)
+
+    rows = []
+    for row in db.session.execute(query.order_by(Product.id)):
+        *values, is_available, updated_at = row
+        if is_available:
+            rows.append(values)
+        else:
+            deleted.append(row.id)
+        if updated_at is not None and (newest is None or updated_at > newest):
+            newest = updated_at
+
+    if newest is None:
+        newest = db.session.query(func.max(Product.updated_at)).scalar() or datetime.utcnow()
+
+    # A product re-created after a tombstone shows up in rows; rows win
+    live = {values[0] for values in rows}
+    return {
+        'full': since is None,
+        'version': newest.isoformat(),
+        'columns': SYNC_COLUMNS,
+        'rows': rows,
+        'deleted': sorted(set(deleted) - live)
+    }
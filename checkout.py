@@ -0,0 +1,262 @@
+"""
+Order creation for the Snacks Shop POS (single checkouts and offline sync)
+"""
+from datetime import datetime, timezone
+from sqlalchemy.exc import IntegrityError
+from models import db, Product, Order, OrderItem, Setting, ArchivedOrder
+from customers import attach_customer
+from promotions import promotions
+from stores import current_store
+from reports import is_day_closed
+import uuid
+
+
+class CheckoutError(Exception):
+    """Raised when an order cannot be created from the submitted lines"""
+
+
+def get_tax_rate():
+    """Get tax rate from settings"""
+    tax_setting = Setting.query.filter_by(key='tax_rate').first()
+    return float(tax_setting.value) if tax_setting else 5.0
+
+
+def generate_invoice_number(when=None):
+    """Generate a unique invoice number"""
+    when = when or datetime.now()
+    return f"INV-{when.strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+
+def load_products(product_ids):
+    """Load products by id with a single query"""
+    product_ids = {int(pid) for pid in product_ids}
+    if not product_ids:
+        return {}
+    products = Product.query.filter(Product.id.in_(product_ids)).all()
+    return {p.id: p for p in products}
+
+
+def build_order(user_id, lines, discount=0, customer_name='', customer_phone='',
+                tax_rate=None, products=None, idempotency_key=None, created_at=None,
+                check_stock=True):
+    """Validate cart lines and build an unsaved order with its items.
+
+    ``lines`` is a list of ``{'product_id', 'quantity', 'price'}`` dicts; a
+    missing price falls back to the current catalog price. Active offers are
+    applied per line and stored on the items; the manual ``discount`` is added
+    on top. The order is not added to any session.
+    """
+    if not lines:
+        raise CheckoutError('Cart is empty')
+
+    if products is None:
+        products = load_products(line['product_id'] for line in lines)
+    if tax_rate is None:
+        tax_rate = get_tax_rate()
+
+    # Validate lines
+    items = []
+    for line in lines:
+        try:
+            product_id = int(line['product_id'])
+            quantity = int(line['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Invalid cart line')
+        if quantity <= 0:
+            raise CheckoutError('Invalid quantity')
+
+        product = products.get(product_id)
+        if product is None:
+            raise CheckoutError(f'Product {product_id} not found')
+        if check_stock and product.stock_quantity < quantity:
+            raise CheckoutError(f'Insufficient stock for {product.name}')
+
+        price = line.get('price')
+        unit_price = float(price) if price is not None else float(product.price)
+        items.append((product, quantity, unit_price))
+
+    # Offers are evaluated at the local time of the sale
+    sold_at = None
+    if created_at is not None:
+        sold_at = created_at.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    line_discounts = promotions.price(items, sold_at)
+
+    # Calculate totals
+    subtotal = sum(unit_price * quantity for _, quantity, unit_price in items)
+    tax_amount = (subtotal * tax_rate) / 100
+    offer_discount = sum(line.amount for line in line_discounts if line)
+    discount_amount = offer_discount + min(max(float(discount or 0), 0), subtotal - offer_discount)
+    total_amount = subtotal + tax_amount - discount_amount
+
+    order = Order(
+        invoice_number=generate_invoice_number(created_at),
+        idempotency_key=idempotency_key,
+        customer_name=customer_name,
+        customer_phone=customer_phone,
+        subtotal=subtotal,
+        tax_amount=tax_amount,
+        discount_amount=discount_amount,
+        total_amount=total_amount,
+        created_by=user_id,
+        store_id=current_store()
+    )
+    if created_at is not None:
+        order.created_at = created_at
+
+    for (product, quantity, unit_price), line in zip(items, line_discounts):
+        order.items.append(OrderItem(
+            product_id=product.id,
+            quantity=quantity,
+            unit_price=unit_price,
+            total_price=unit_price * quantity,
+            discount_amount=line.amount if line else 0.0,
+            offer_id=line.offer_id if line else None
+        ))
+    return order
+
+
+def create_order(user_id, lines, **kwargs):
+    """Validate cart lines and add the order with its items to the session.
+
+    Takes the same arguments as ``build_order``. All validation runs before
+    anything is added, so a failed order leaves the session untouched. The
+    order is linked to its customer by phone number. The caller is
+    responsible for committing.
+    """
+    order = build_order(user_id, lines, **kwargs)
+    attach_customer(order)
+    db.session.add(order)
+    db.session.flush()
+    return order
+
+
+def find_orders_by_keys(keys, chunk_size=500):
+    """Map idempotency keys that already have an order to (order id, invoice number)"""
+    keys = list(keys)
+    found = {}
+    for model in (Order, ArchivedOrder):
+        # Only keys missing from the hot table are looked up in the archive
+        pending = [key for key in keys if key not in found]
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            rows = db.session.query(
+                model.idempotency_key, model.id, model.invoice_number
+            ).filter(model.idempotency_key.in_(chunk)).all()
+            for key, order_id, invoice_number in rows:
+                found[key] = (order_id, invoice_number)
+    return found
+
+
+def _parse_client_time(value):
+    """Parse an ISO timestamp from a terminal into naive UTC (as stored by the models)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    if parsed > datetime.utcnow():
+        return None
+    return parsed
+
+
+def _payload_items(payload):
+    """Cart lines of an offline order payload, or None if it is malformed"""
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not all(isinstance(line, dict) for line in items):
+        return None
+    return items
+
+
+def sync_orders(user_id, payloads):
+    """Ingest a batch of offline orders in one transaction.
+
+    Orders are deduplicated by their client-generated ``idempotency_key``, both
+    against the database and within the batch, so a retried upload never
+    creates duplicate rows. Returns one result dict per payload, in order.
+    """
+    for attempt in range(2):
+        try:
+            results, created = _sync_orders_once(user_id, payloads)
+            db.session.commit()
+            return results, created
+        except IntegrityError:
+            # A concurrent upload inserted one of the keys first; the retry
+            # reports those orders as duplicates.
+            db.session.rollback()
+            if attempt:
+                raise
+
+
+def _sync_orders_once(user_id, payloads):
+    keys = [p.get('idempotency_key') for p in payloads if isinstance(p, dict)]
+    existing = find_orders_by_keys(k for k in keys if isinstance(k, str) and k)
+
+    product_ids = set()
+    for payload in payloads:
+        for line in _payload_items(payload) or []:
+            if str(line.get('product_id', '')).isdigit():
+                product_ids.add(int(line['product_id']))
+    products = load_products(product_ids)
+    tax_rate = get_tax_rate()
+    closed_days = {}
+
+    results = []
+    created = []
+    for payload in payloads:
+        key = payload.get('idempotency_key') if isinstance(payload, dict) else None
+        if not isinstance(key, str) or not key or len(key) > 64:
+            results.append({'idempotency_key': key, 'status': 'error',
+                            'error': 'Missing or invalid idempotency_key'})
+            continue
+
+        if key in existing:
+            order_id, invoice_number = existing[key]
+            results.append({'idempotency_key': key, 'status': 'duplicate',
+                            'order_id': order_id, 'invoice_number': invoice_number})
+            continue
+
+        items = _payload_items(payload)
+        if items is None:
+            results.append({'idempotency_key': key, 'status': 'error',
+                            'error': 'items must be a list of cart lines'})
+            continue
+
+        # Offline terminals sell from their cached catalog, so the server
+        # price is authoritative and stock is not re-checked after the fact.
+        lines = [{'product_id': line.get('product_id'), 'quantity': line.get('quantity')}
+                 for line in items]
+
+        # A sale from a day whose Z-report is already frozen is booked today,
+        # so it shows up in the reports instead of hiding behind the summary
+        created_at = _parse_client_time(payload.get('created_at'))
+        if created_at is not None:
+            day = created_at.date()
+            if day not in closed_days:
+                closed_days[day] = is_day_closed(day)
+            if closed_days[day]:
+                created_at = None
+        try:
+            order = create_order(
+                user_id,
+                lines,
+                discount=payload.get('discount', 0),
+                customer_name=payload.get('customer_name', ''),
+                customer_phone=payload.get('customer_phone', ''),
+                tax_rate=tax_rate,
+                products=products,
+                idempotency_key=key,
+                created_at=created_at,
+                check_stock=False
+            )
+        except (CheckoutError, TypeError, ValueError) as e:
+            results.append({'idempotency_key': key, 'status': 'error', 'error': str(e)})
+            continue
+
+        existing[key] = (order.id, order.invoice_number)
+        created.append(order)
+        results.append({'idempotency_key': key, 'status': 'created',
+                        'order_id': order.id, 'invoice_number': order.invoice_number})
+    return results, created
@@ -32,4 +32,79 @@ class Config:
     DEFAULT_GST_RATE = 0.0  # 0%
     DEFAULT_SHOP_NAME = "Trio Snacks"
     DEFAULT_STOCK_ALERT_THRESHOLD = 10
-
+    LOW_STOCK_TTL = 60  # seconds; the low-stock index is rebuilt this often to pick up other workers' writes
+    
+    # Offline billing: maximum number of queued orders accepted per sync request
+    ORDER_SYNC_MAX_BATCH = 1000
+    
+    # Barcode scanners: maximum number of codes resolved per batched lookup
+    BARCODE_LOOKUP_MAX_BATCH = 200
+    
+    # Barcode label sheets: symbols are cached per barcode value, and batches needing at
+    # least LABEL_POOL_THRESHOLD new symbols render them in a process pool
+    LABEL_MAX_LABELS = 5000  # labels per sheet request
+    LABEL_SYMBOL_CACHE_BYTES = 16 * 1024 * 1024  # 16MB
+    LABEL_POOL_THRESHOLD = 100
+    LABEL_POOL_WORKERS = None  # default: one per CPU
+    
+    # Order archive: months kept in the hot orders tables by `flask archive-orders`
+    ARCHIVE_KEEP_MONTHS = 3
+    
+    # Rendered page cache for the public home and menu pages
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1') != '0'
+    PAGE_CACHE_MAX_BYTES = 8 * 1024 * 1024  # 8MB
+    PAGE_CACHE_TTL = 300  # seconds; bounds staleness of the popularity list and of edits made in other workers
+    
+    # Static snapshot of the public pages under static/<STATIC_SNAPSHOT_DIR>, re-exported
+    # after catalog, offer and setting changes (off on Vercel, whose files are read-only)
+    STATIC_SNAPSHOT_ENABLED = os.environ.get('STATIC_SNAPSHOT', '0' if os.environ.get('VERCEL') else '1') != '0'
+    STATIC_SNAPSHOT_DIR = 'snapshot'
+    STATIC_SNAPSHOT_DELAY = 2.0  # seconds; a burst of admin writes triggers one export
+    STATIC_SNAPSHOT_MAX_AGE = 300  # seconds; re-exported this often, and the CDN cache lifetime
+    
+    # Delta catalog sync: re-send changes this close to a terminal's watermark
+    CATALOG_SYNC_OVERLAP_SECONDS = 5
+    
+    # Live dashboard feed (Server-Sent Events)
+    EVENT_QUEUE_SIZE = 100  # pending events per dashboard before the oldest are dropped
+    EVENT_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+    DASHBOARD_COUNTERS_TTL = 30  # seconds; pushed counters re-read orders of other workers this often
+    
+    # Multi-store: outlets served by this deployment. With STORE_SHARD_URI set
+    # (e.g. 'sqlite:///store_{store}.db'), orders of every store except
+    # DEFAULT_STORE live in their own SQLite file; the catalog stays shared.
+    STORES = [s.strip() for s in os.environ.get('STORES', 'main').split(',') if s.strip()]
+    DEFAULT_STORE = os.environ.get('DEFAULT_STORE') or STORES[0]
+    STORE_SHARD_URI = os.environ.get('STORE_SHARD_URI')
+    HEAD_OFFICE_MAX_WORKERS = 8  # shards queried in parallel by head-office reports
+    
+    # Read/write split: SELECTs of read-only routes (reports, history, public pages)
+    # use this bind, e.g. the same WAL database opened read-only:
+    # 'sqlite:///file:/path/to/database.db?mode=ro&uri=true', or a replica file
+    SQLALCHEMY_READ_URI = os.environ.get('DATABASE_READ_URL')
+    
+    # Group commit: checkouts are committed in small batches by one writer thread
+    ORDER_WRITER_ENABLED = os.environ.get('ORDER_WRITER') == '1'
+    ORDER_WRITER_MAX_BATCH = 50  # orders per commit
+    ORDER_WRITER_MAX_DELAY = 0.002  # seconds the writer waits to fill a batch
+    ORDER_WRITER_TIMEOUT = 10  # seconds a checkout waits for its commit
+    
+    # Order event journal: appended in batches by a background thread, read with /api/journal
+    JOURNAL_ENABLED = os.environ.get('JOURNAL_ENABLED', '1') != '0'
+    JOURNAL_MAX_BATCH = 200  # events per insert
+    JOURNAL_MAX_DELAY = 0.05  # seconds the writer waits to fill a batch
+    JOURNAL_MAX_RETRIES = 5  # attempts before a batch is parked
+    JOURNAL_PARKED_FILE = 'order_events_parked.jsonl'  # in the instance folder
+    JOURNAL_TAIL_MAX = 1000  # events per /api/journal response
+    
+    # Admin product list page size
+    ADMIN_PRODUCTS_PER_PAGE = 50
+    
+    # Demand forecast and reorder suggestions (recomputed once a day)
+    FORECAST_HISTORY_DAYS = 365  # days of sales the forecast looks at
+    FORECAST_HORIZON_DAYS = 7  # days a reorder should last
+    FORECAST_LEAD_TIME_DAYS = 2  # days between placing and receiving a reorder
+    FORECAST_SERVICE_Z = 1.65  # safety stock in standard deviations (~95% of days without running out)
+    
+    # Customer ledger: orders shown when a phone number is looked up at the till
+    CUSTOMER_RECENT_ORDERS = 5
@@ -0,0 +1,139 @@
+"""
+Customer ledger: repeat customers identified by phone number
+"""
+import re
+from datetime import datetime
+from sqlalchemy import case, update
+from models import db, Customer, Order, ArchivedOrder
+
+PHONE_DIGITS = 10
+MIN_PHONE_DIGITS = 6
+
+
+def normalize_phone(phone):
+    """Digits of a phone number without country prefix, or None if it is not a usable number.
+
+    ``+91 98765-43210``, ``098765 43210`` and ``9876543210`` all map to the
+    same ledger entry.
+    """
+    digits = re.sub(r'\D', '', str(phone or ''))
+    if len(digits) < MIN_PHONE_DIGITS:
+        return None
+    return digits[-PHONE_DIGITS:]
+
+
+def find_customer(phone):
+    phone = normalize_phone(phone)
+    if phone is None:
+        return None
+    return Customer.query.filter_by(phone=phone).first()
+
+
+def _insert(table):
+    """INSERT that supports ON CONFLICT on the database holding ``table``"""
+    dialect = db.session.get_bind(mapper=Customer).dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(table)
+
+
+def attach_customer(order):
+    """Link an order to its customer by phone and add it to the running totals.
+
+    A single ``INSERT ... ON CONFLICT (phone) DO UPDATE`` creates the
+    customer on a first visit or bumps the totals in SQL, so concurrent
+    checkouts for the same phone neither lose visits nor collide on the
+    unique phone. The ledger lives next to the orders (see stores.py), so it
+    commits with them. Orders without a usable phone number are left alone.
+    """
+    phone = normalize_phone(order.customer_phone)
+    if phone is None:
+        return None
+    visited_at = order.created_at or datetime.utcnow()
+    spend = order.total_amount or 0.0
+
+    stmt = _insert(Customer.__table__)
+    if stmt is None:
+        return _attach_customer_fallback(order, phone, visited_at, spend)
+    stmt = stmt.values(phone=phone, name=order.customer_name or None, visit_count=1,
+                       lifetime_spend=spend, first_visit=visited_at, last_visit=visited_at)
+    stmt = stmt.on_conflict_do_update(index_elements=['phone'], set_={
+        'name': db.func.coalesce(stmt.excluded.name, Customer.name),
+        'visit_count': Customer.visit_count + 1,
+        'lifetime_spend': Customer.lifetime_spend + stmt.excluded.lifetime_spend,
+        # Late offline syncs and backfills can arrive out of order
+        'first_visit': case((Customer.first_visit > stmt.excluded.first_visit, stmt.excluded.first_visit),
+                            else_=db.func.coalesce(Customer.first_visit, stmt.excluded.first_visit)),
+        'last_visit': case((Customer.last_visit < stmt.excluded.last_visit, stmt.excluded.last_visit),
+                           else_=db.func.coalesce(Customer.last_visit, stmt.excluded.last_visit))
+    }).returning(Customer.id)
+    order.customer_id = db.session.execute(stmt).scalar_one()
+    return order.customer_id
+
+
+def _attach_customer_fallback(order, phone, visited_at, spend):
+    # Databases without ON CONFLICT: look up, then insert or update
+    customer = Customer.query.filter_by(phone=phone).first()
+    if customer is None:
+        customer = Customer(phone=phone, name=order.customer_name or None, visit_count=1,
+                            lifetime_spend=spend, first_visit=visited_at, last_visit=visited_at)
+        db.session.add(customer)
+        db.session.flush()
+    else:
+        values = {
+            'visit_count': Customer.visit_count + 1,
+            'lifetime_spend': Customer.lifetime_spend + spend,
+            'last_visit': case((Customer.last_visit < visited_at, visited_at),
+                               else_=db.func.coalesce(Customer.last_visit, visited_at))
+        }
+        if order.customer_name:
+            values['name'] = order.customer_name
+        db.session.execute(update(Customer).where(Customer.id == customer.id).values(**values))
+    order.customer_id = customer.id
+    return customer.id
+
+
+def release_order(order):
+    """Take a deleted order back out of its customer's totals"""
+    if not order.customer_id:
+        return
+    db.session.execute(update(Customer).where(Customer.id == order.customer_id).values(
+        visit_count=case((Customer.visit_count > 0, Customer.visit_count - 1), else_=0),
+        lifetime_spend=Customer.lifetime_spend - (order.total_amount or 0.0)
+    ))
+
+
+def recent_orders(customer, limit=5):
+    """A customer's latest orders, read through the (customer_id, created_at) index"""
+    return Order.query.filter_by(customer_id=customer.id).order_by(
+        Order.created_at.desc()).limit(limit).all()
+
+
+def backfill(chunk_size=500):
+    """Link existing orders that carry a phone number but no customer yet.
+
+    Runs oldest first, so first and last visits come out right. Returns the
+    number of orders linked.
+    """
+    linked = 0
+    for model in (ArchivedOrder, Order):
+        last_id = 0
+        while True:
+            orders = model.query.filter(
+                model.customer_id.is_(None),
+                model.customer_phone.isnot(None),
+                model.customer_phone != '',
+                model.id > last_id
+            ).order_by(model.id).limit(chunk_size).all()
+            if not orders:
+                break
+            for order in sorted(orders, key=lambda o: o.created_at or datetime.min):
+                if attach_customer(order) is not None:
+                    linked += 1
+            last_id = orders[-1].id
+            db.session.commit()
+    return linked
@@ -0,0 +1,192 @@
+"""
+In-process event broker and live dashboard counters (Server-Sent Events)
+"""
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import func
+from models import db, Product, Order, OrderItem
+from stores import current_store
+
+
+class EventBroker:
+    """Fan events out to subscribers through bounded per-client queues.
+
+    A slow client never blocks publishers: when its queue is full the oldest
+    pending event is dropped to make room. Subscribers only receive events
+    of the store they watch.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # queue -> store id
+
+    def subscribe(self, store_id=None):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[subscriber] = store_id
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    def publish(self, event, data, store_id=None):
+        message = (event, data)
+        with self._lock:
+            subscribers = [subscriber for subscriber, store in self._subscribers.items()
+                           if store == store_id]
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(message)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def today_totals(day=None):
+    """Order count, sales and units per product name of a day, read from the database"""
+    day = day or datetime.now().date()
+    start = datetime.combine(day, datetime.min.time())
+    end = datetime.combine(day, datetime.max.time())
+    in_day = (Order.created_at >= start) & (Order.created_at <= end)
+    count, sales = db.session.query(
+        func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0.0)
+    ).filter(in_day).one()
+    rows = db.session.query(Product.name, func.sum(OrderItem.quantity)).join(
+        OrderItem, OrderItem.product_id == Product.id
+    ).join(Order, OrderItem.order_id == Order.id).filter(in_day).group_by(Product.id).all()
+    return count, sales, Counter({name: quantity for name, quantity in rows})
+
+
+def format_counters(count, sales, items, top=5):
+    return {
+        'today_sales': round(sales, 2),
+        'today_orders_count': count,
+        'top_items': [[name, quantity] for name, quantity in items.most_common(top)]
+    }
+
+
+def today_stats(top=5):
+    """Today's dashboard counters for the current store, straight from the database"""
+    return format_counters(*today_totals(), top=top)
+
+
+class _StoreCounters:
+    def __init__(self):
+        self.day = None
+        self.seeded_at = 0.0
+        self.sales = 0.0
+        self.orders = 0
+        self.items = Counter()  # product name -> quantity
+
+
+class DashboardCounters:
+    """Today's sales, order count and top items per store, for live pushes.
+
+    Advanced by each order committed in this process, so a push does not
+    re-aggregate orders. Orders committed or deleted by other workers are
+    only seen when the counters are re-seeded from the database, every
+    ``ttl`` seconds and on a new day; pages render from ``today_stats``.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stores = {}  # store id -> _StoreCounters
+
+    def _counters(self):
+        """The current store's counters and whether they were just re-seeded"""
+        counters = self._stores.setdefault(current_store(), _StoreCounters())
+        today = datetime.now().date()
+        if counters.day == today and time.monotonic() - counters.seeded_at <= self.ttl:
+            return counters, False
+        counters.orders, counters.sales, counters.items = today_totals(today)
+        counters.day = today
+        counters.seeded_at = time.monotonic()
+        return counters, True
+
+    def record(self, orders):
+        """Advance the current store's counters with newly committed orders"""
+        with self._lock:
+            counters, seeded = self._counters()
+            if seeded:
+                # Seeding reads the committed orders, so they are already counted
+                return
+            for order in orders:
+                if order.created_at and order.created_at.date() != counters.day:
+                    continue
+                counters.orders += 1
+                counters.sales += order.total_amount
+                for item in order.items:
+                    counters.items[item.product.name] += item.quantity
+
+    def invalidate(self):
+        """Re-seed on next use, e.g. after an order was deleted"""
+        with self._lock:
+            self._stores.pop(current_store(), None)
+
+    def snapshot(self, top=5):
+        with self._lock:
+            counters, _ = self._counters()
+            return format_counters(counters.orders, counters.sales, counters.items, top=top)
+
+
+broker = EventBroker()
+dashboard_counters = DashboardCounters()
+
+
+def publish_orders(orders):
+    """Push new-order events and the updated counters to live dashboards"""
+    if not orders:
+        return
+    dashboard_counters.record(orders)
+    if broker.subscriber_count == 0:
+        return
+    store = current_store()
+    for order in orders:
+        broker.publish('order', {
+            'id': order.id,
+            'invoice_number': order.invoice_number,
+            'created_at': order.created_at.isoformat() if order.created_at else None,
+            'total_amount': order.total_amount
+        }, store)
+    broker.publish('counters', dashboard_counters.snapshot(), store)
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events message"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream_events(subscriber, initial=None, heartbeat=15):
+    """Yield SSE messages for one subscriber, with periodic keep-alive comments.
+
+    Runs without touching the database, so a long-lived stream holds no
+    connection; ``initial`` counters are computed by the caller.
+    """
+    try:
+        if initial is not None:
+            yield format_sse('counters', initial)
+        while True:
+            try:
+                event, data = subscriber.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield format_sse(event, data)
+    finally:
+        broker.unsubscribe(subscriber)
@@ -0,0 +1,170 @@
+"""
+Demand forecasting and reorder suggestions from daily item sales
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import func, select
+from flask import current_app
+from models import db, Product
+from archive import needs_archive
+from reports import ORDER_SOURCES
+from stores import current_store
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+def load_daily_quantities(product_ids, start_day, end_day):
+    """Units sold per product per day as a ``len(product_ids) x days`` array.
+
+    One grouped query per order table returns (product, day, quantity)
+    rows, which are scattered into the matrix in a single vectorized step.
+    ``product_ids`` must be sorted; sales of other products are ignored.
+    """
+    n_days = (end_day - start_day).days + 1
+    matrix = np.zeros((len(product_ids), n_days))
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+    if not len(product_ids):
+        return matrix
+
+    sources = ORDER_SOURCES if needs_archive(start_day) else ORDER_SOURCES[:1]
+    for order_model, item_model in sources:
+        day = func.date(order_model.created_at)
+        rows = db.session.execute(
+            select(item_model.product_id, day, func.sum(item_model.quantity))
+            .join(order_model, item_model.order_id == order_model.id)
+            .where(order_model.created_at >= start, order_model.created_at < end)
+            .group_by(item_model.product_id, day)
+        ).all()
+        if not rows:
+            continue
+        ids, days, quantities = (np.array(column) for column in zip(*rows))
+        positions = np.searchsorted(product_ids, ids.astype(np.int64))
+        positions = np.minimum(positions, len(product_ids) - 1)
+        known = product_ids[positions] == ids
+        columns = (days.astype('datetime64[D]') - np.datetime64(start_day)).astype(np.int64)
+        np.add.at(matrix, (positions[known], columns[known]), quantities[known].astype(float))
+    return matrix
+
+
+def trailing_mean(matrix, window):
+    """Mean of the last ``window`` days for every product"""
+    window = min(window, matrix.shape[1])
+    return matrix[:, -window:].mean(axis=1)
+
+
+def weekday_seasonality(matrix, start_day):
+    """Products x 7 ratios of each weekday's mean sales to the overall mean (1.0 without sales)"""
+    weekdays = (np.arange(matrix.shape[1]) + start_day.weekday()) % 7
+    onehot = np.eye(7)[weekdays]
+    weekday_means = (matrix @ onehot) / np.maximum(onehot.sum(axis=0), 1)
+    overall = matrix.mean(axis=1, keepdims=True)
+    return np.divide(weekday_means, overall, out=np.ones_like(weekday_means), where=overall > 0)
+
+
+def forecast(matrix, start_day, horizon, lead_time, service_z, stock):
+    """Forecasts and reorder quantities for every row of a daily sales matrix.
+
+    The level is the 28-day moving average, which covers each weekday
+    equally, scaled by the weekday seasonality of the day forecast. The
+    reorder quantity covers the lead time plus the horizon, with a safety
+    stock of ``service_z`` standard deviations of recent daily sales.
+    """
+    end_day = start_day + timedelta(days=matrix.shape[1] - 1)
+    average_7 = trailing_mean(matrix, 7)
+    average_28 = trailing_mean(matrix, 28)
+    seasonality = weekday_seasonality(matrix, start_day)
+
+    cover = lead_time + horizon
+    future_weekdays = (np.arange(1, cover + 1) + end_day.weekday()) % 7
+    daily = average_28[:, None] * seasonality[:, future_weekdays]
+    demand = daily.sum(axis=1)
+    safety = service_z * matrix[:, -28:].std(axis=1) * np.sqrt(cover)
+    reorder = np.maximum(np.ceil(demand + safety - stock), 0)
+
+    rate = demand / cover
+    days_of_cover = np.divide(stock, rate, out=np.full_like(rate, np.inf), where=rate > 0)
+    return {
+        'average_7': average_7,
+        'average_28': average_28,
+        'seasonality': seasonality,
+        'forecast': daily[:, :horizon].sum(axis=1),
+        'days_of_cover': days_of_cover,
+        'reorder': reorder
+    }
+
+
+class DemandForecaster:
+    """Per-store demand forecast over the sales history, computed once a day.
+
+    The history ends yesterday, so a day's forecast does not change while
+    the day's sales come in; ``invalidate`` forces a recomputation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}  # store -> result dict
+
+    def get(self):
+        today = datetime.now().date()
+        store = current_store()
+        result = self._results.get(store)
+        if result is None or result['day'] != today:
+            result = self._compute(today)
+            with self._lock:
+                self._results[store] = result
+        return result
+
+    def invalidate(self):
+        with self._lock:
+            self._results.clear()
+
+    def _compute(self, today):
+        config = current_app.config
+        started = time.perf_counter()
+        end_day = today - timedelta(days=1)
+        start_day = end_day - timedelta(days=config['FORECAST_HISTORY_DAYS'] - 1)
+
+        products = db.session.execute(
+            select(Product.id, Product.name, Product.category, Product.stock_quantity)
+            .order_by(Product.id)
+        ).all()
+        product_ids = np.array([p.id for p in products], dtype=np.int64)
+        stock = np.array([p.stock_quantity or 0 for p in products], dtype=float)
+
+        matrix = load_daily_quantities(product_ids, start_day, end_day)
+        result = forecast(matrix, start_day, config['FORECAST_HORIZON_DAYS'],
+                          config['FORECAST_LEAD_TIME_DAYS'], config['FORECAST_SERVICE_Z'], stock)
+        sold = matrix.sum(axis=1)
+        peaks = result['seasonality'].argmax(axis=1)
+
+        rows = [{
+            'product_id': product.id,
+            'name': product.name,
+            'category': product.category,
+            'stock': product.stock_quantity,
+            'sold': int(sold[i]),
+            'average_7': round(float(result['average_7'][i]), 2),
+            'average_28': round(float(result['average_28'][i]), 2),
+            'forecast': round(float(result['forecast'][i]), 1),
+            'days_of_cover': None if np.isinf(result['days_of_cover'][i])
+            else round(float(result['days_of_cover'][i]), 1),
+            'peak_day': WEEKDAYS[peaks[i]] if sold[i] else None,
+            'reorder': int(result['reorder'][i])
+        } for i, product in enumerate(products)]
+        rows.sort(key=lambda row: (-row['reorder'], -row['forecast']))
+
+        return {
+            'day': today,
+            'start_day': start_day,
+            'end_day': end_day,
+            'horizon_days': config['FORECAST_HORIZON_DAYS'],
+            'lead_time_days': config['FORECAST_LEAD_TIME_DAYS'],
+            'products': rows,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+
+demand_forecaster = DemandForecaster()
@@ -0,0 +1,43 @@
+"""
+Head-office queries fanned out across store shards
+"""
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from stores import use_store
+from reports import sales_report
+
+TOTAL_FIELDS = ('order_count', 'subtotal', 'tax_amount', 'discount_amount', 'total_amount')
+
+
+def fan_out(fn, stores=None, max_workers=None):
+    """Run the read-only ``fn()`` once per store, in parallel.
+
+    Each call gets its own app context (and therefore its own session) with
+    the store active, so its queries go to that store's shard. Returns a
+    dict of store id -> result in store order.
+    """
+    app = current_app._get_current_object()
+    stores = list(stores or app.config['STORES'])
+    if not stores:
+        return {}
+    max_workers = max_workers or app.config['HEAD_OFFICE_MAX_WORKERS']
+
+    def run(store):
+        with app.app_context(), use_store(store):
+            return fn()
+
+    with ThreadPoolExecutor(max_workers=min(len(stores), max_workers)) as pool:
+        return dict(zip(stores, pool.map(run, stores)))
+
+
+def chain_sales(start_day, end_day, stores=None):
+    """Sales totals per store and for the whole chain between two dates"""
+    reports = fan_out(lambda: sales_report(start_day, end_day), stores)
+    totals = {field: 0 for field in TOTAL_FIELDS}
+    for report in reports.values():
+        for field in TOTAL_FIELDS:
+            totals[field] += report['totals'][field]
+    return {
+        'stores': [dict(report['totals'], store=store) for store, report in reports.items()],
+        'totals': totals
+    }
@@ -0,0 +1,103 @@
+"""
+Low-stock tracking for the Snacks Shop application
+"""
+import threading
+import time
+from models import db, Product, Setting
+from config import Config
+
+
+class LowStockIndex:
+    """Process-local set of products at or below the stock alert threshold.
+
+    The index is built with a query on the indexed ``stock_quantity``
+    column and afterwards only the products touched by a checkout or an admin
+    edit in this process are re-checked, so alerts never require loading the
+    whole catalog. It is rebuilt every ``ttl`` seconds, so writes made by
+    other workers show up too.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = None  # product_id -> {'id', 'name', 'category', 'stock_quantity'}
+        self._threshold = None
+        self._loaded_at = 0.0
+
+    def _load_threshold(self):
+        setting = Setting.query.filter_by(key='stock_alert_threshold').first()
+        try:
+            return int(float(setting.value)) if setting else Config.DEFAULT_STOCK_ALERT_THRESHOLD
+        except ValueError:
+            return Config.DEFAULT_STOCK_ALERT_THRESHOLD
+
+    @staticmethod
+    def _row_to_item(row):
+        return {
+            'id': row.id,
+            'name': row.name,
+            'category': row.category,
+            'stock_quantity': row.stock_quantity
+        }
+
+    def _ensure_loaded(self):
+        """Build the index on first use or once it expired (caller must hold the lock)"""
+        if self._items is not None and time.monotonic() - self._loaded_at <= self.ttl:
+            return
+        threshold = self._load_threshold()
+        rows = db.session.query(
+            Product.id, Product.name, Product.category, Product.stock_quantity
+        ).filter(Product.stock_quantity <= threshold).all()
+        self._items = {row.id: self._row_to_item(row) for row in rows}
+        self._threshold = threshold
+        self._loaded_at = time.monotonic()
+
+    @property
+    def threshold(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._threshold
+
+    def refresh(self, product_ids):
+        """Re-check only the given products against the threshold"""
+        product_ids = {int(pid) for pid in product_ids if pid is not None}
+        if not product_ids:
+            return
+        with self._lock:
+            if self._items is None:
+                # Nothing cached yet, the next read builds the full index
+                return
+            rows = db.session.query(
+                Product.id, Product.name, Product.category, Product.stock_quantity
+            ).filter(Product.id.in_(product_ids)).all()
+            found = set()
+            for row in rows:
+                found.add(row.id)
+                if row.stock_quantity <= self._threshold:
+                    self._items[row.id] = self._row_to_item(row)
+                else:
+                    self._items.pop(row.id, None)
+            # Deleted products drop out of the index
+            for product_id in product_ids - found:
+                self._items.pop(product_id, None)
+
+    def invalidate(self):
+        """Drop the index, e.g. after the threshold setting changes"""
+        with self._lock:
+            self._items = None
+            self._threshold = None
+
+    def items(self):
+        """Low-stock products ordered by remaining stock"""
+        with self._lock:
+            self._ensure_loaded()
+            items = list(self._items.values())
+        return sorted(items, key=lambda item: (item['stock_quantity'], item['name']))
+
+    def count(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._items)
+
+
+low_stock = LowStockIndex()
@@ -0,0 +1,195 @@
+"""
+Append-only order event journal, written by a background thread
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert, select
+from flask import current_app
+from models import db, OrderEvent
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = 'order.created'
+ORDER_DELETED = 'order.deleted'
+
+
+def order_snapshot(order):
+    """JSON-ready copy of an order and its items, as journaled"""
+    return {
+        'id': order.id,
+        'invoice_number': order.invoice_number,
+        'store_id': order.store_id,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+        'created_by': order.created_by,
+        'customer_id': order.customer_id,
+        'subtotal': order.subtotal,
+        'tax_amount': order.tax_amount,
+        'discount_amount': order.discount_amount,
+        'total_amount': order.total_amount,
+        'items': [{
+            'product_id': item.product_id,
+            'quantity': item.quantity,
+            'unit_price': item.unit_price,
+            'total_price': item.total_price,
+            'discount_amount': item.discount_amount,
+            'offer_id': item.offer_id
+        } for item in order.items]
+    }
+
+
+class OrderJournal:
+    """Appends order events to the ``order_events`` table in batches.
+
+    Requests snapshot the order after their commit and hand the event to
+    ``record``; one writer thread per process inserts queued events in
+    batches of up to ``max_batch``, so checkouts never wait on the journal.
+    Sequence numbers follow commit order only within one process: events of
+    several workers interleave, and on PostgreSQL a lower ``seq`` can become
+    visible after a higher one. A batch that still fails after
+    ``max_retries`` attempts is logged and parked in ``JOURNAL_PARKED_FILE``
+    so the writer moves on. Pending events are flushed at interpreter exit.
+    """
+
+    def __init__(self, max_batch=200, max_delay=0.05, max_retries=5, exit_timeout=10.0):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.exit_timeout = exit_timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._app = None
+        self._batches = 0
+        self._events = 0
+        self._retries = 0
+        self._parked = 0
+
+    def record(self, event_type, snapshot):
+        if not current_app.config['JOURNAL_ENABLED']:
+            return
+        self._ensure_started()
+        self._queue.put({
+            'event_type': event_type,
+            'order_id': snapshot['id'],
+            'store_id': snapshot['store_id'],
+            'payload': json.dumps(snapshot),
+            'recorded_at': datetime.utcnow()
+        })
+
+    def record_orders(self, event_type, orders):
+        for order in orders:
+            self.record(event_type, order_snapshot(order))
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._app = current_app._get_current_object()
+                    self._thread = threading.Thread(target=self._run, name='order-journal', daemon=True)
+                    self._thread.start()
+                    atexit.register(self._flush_at_exit)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._app.app_context():
+                self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        delay = 0.1
+        for attempt in range(self.max_retries):
+            try:
+                db.session.execute(insert(OrderEvent), batch)
+                db.session.commit()
+                break
+            except Exception:
+                db.session.rollback()
+                logger.exception('Could not append %d order events (attempt %d of %d)',
+                                  len(batch), attempt + 1, self.max_retries)
+                if attempt + 1 == self.max_retries:
+                    self._park(batch)
+                    return
+                with self._lock:
+                    self._retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+        with self._lock:
+            self._batches += 1
+            self._events += len(batch)
+
+    def _park(self, batch):
+        # Keep the events for a manual replay instead of blocking the journal
+        lines = ''.join(json.dumps(dict(event, recorded_at=event['recorded_at'].isoformat())) + '\n'
+                        for event in batch)
+        try:
+            os.makedirs(current_app.instance_path, exist_ok=True)
+            with open(os.path.join(current_app.instance_path,
+                                   current_app.config['JOURNAL_PARKED_FILE']), 'a') as f:
+                f.write(lines)
+            logger.error('Parked %d order events in %s', len(batch), current_app.config['JOURNAL_PARKED_FILE'])
+        except OSError:
+            logger.exception('Could not park %d order events:\n%s', len(batch), lines)
+        with self._lock:
+            self._parked += len(batch)
+
+    def flush(self, timeout=None):
+        """Block until every recorded event is stored or parked (tests, shutdown).
+
+        Returns False if ``timeout`` seconds pass first.
+        """
+        if self._thread is None:
+            return True
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def _flush_at_exit(self):
+        if not self.flush(self.exit_timeout):
+            logger.error('Exiting with %d order events not journaled', self._queue.unfinished_tasks)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._thread is not None,
+                'pending': self._queue.qsize(),
+                'batches': self._batches,
+                'events': self._events,
+                'retries': self._retries,
+                'parked': self._parked
+            }
+
+
+order_journal = OrderJournal()
+
+
+def tail(after=0, limit=500, event_type=None, store_id=None):
+    """Events with a sequence number above ``after``, oldest first"""
+    stmt = select(OrderEvent).where(OrderEvent.seq > after)
+    if event_type:
+        stmt = stmt.where(OrderEvent.event_type == event_type)
+    if store_id:
+        stmt = stmt.where(OrderEvent.store_id == store_id)
+    events = db.session.execute(stmt.order_by(OrderEvent.seq).limit(limit)).scalars().all()
+    return [{
+        'seq': event.seq,
+        'event_type': event.event_type,
+        'order_id': event.order_id,
+        'store_id': event.store_id,
+        'recorded_at': event.recorded_at.isoformat(),
+        'order': json.loads(event.payload)
+    } for event in events]
@@ -0,0 +1,174 @@
+"""
+Printable barcode label sheets for products
+"""
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import barcode
+from barcode.writer import ImageWriter
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from page_cache import PageCache
+
+# 24 labels per A4 sheet (3 x 8, 70 x 37 mm), the common self-adhesive layout
+SHEET_COLUMNS = 3
+SHEET_ROWS = 8
+LABELS_PER_SHEET = SHEET_COLUMNS * SHEET_ROWS
+PNG_DPI = 200
+
+SYMBOL_OPTIONS = {'module_height': 10.0, 'font_size': 7, 'text_distance': 3.5, 'quiet_zone': 2.0, 'dpi': PNG_DPI}
+
+
+def ean13_check_digit(digits):
+    """Check digit for the first 12 digits of an EAN-13 code"""
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def internal_barcode(product_id):
+    """In-store EAN-13 for a product without a manufacturer barcode (prefix 2 is reserved for in-store use)"""
+    digits = f'2{product_id:011d}'
+    return digits + ean13_check_digit(digits)
+
+
+def symbology(value):
+    """EAN-13 for valid 13-digit codes, Code 128 for anything else"""
+    if len(value) == 13 and value.isdigit() and ean13_check_digit(value) == value[-1]:
+        return 'ean13'
+    return 'code128'
+
+
+def render_symbol(value):
+    """PNG of the barcode symbol for ``value``"""
+    buffer = io.BytesIO()
+    barcode.get(symbology(value), value, writer=ImageWriter()).write(buffer, options=SYMBOL_OPTIONS)
+    return buffer.getvalue()
+
+
+def _render_symbols(values):
+    # Runs in the worker processes
+    return [render_symbol(value) for value in values]
+
+
+class LabelRenderer:
+    """Renders label sheets from cached barcode symbols.
+
+    Symbol PNGs are cached per barcode value, so reprinting a sheet only
+    lays out the page. When a batch needs many new symbols they are rendered
+    in a process pool, in chunks, instead of one by one in the request.
+    """
+
+    def __init__(self, pool_threshold=100, workers=None, chunk_size=50):
+        self.pool_threshold = pool_threshold
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.symbols = PageCache(max_bytes=16 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._rendered = 0
+        self._pooled = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn: forking a process that runs writer and SSE threads is unsafe
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def get_symbols(self, values):
+        """Map each barcode value to its symbol PNG, rendering only the missing ones"""
+        found = {}
+        missing = []
+        for value in dict.fromkeys(values):
+            entry = self.symbols.get(value)
+            if entry is None:
+                missing.append(value)
+            else:
+                found[value] = entry[0]
+
+        if len(missing) >= self.pool_threshold:
+            chunks = [missing[i:i + self.chunk_size] for i in range(0, len(missing), self.chunk_size)]
+            rendered = [png for chunk in self._get_pool().map(_render_symbols, chunks) for png in chunk]
+            pooled = len(missing)
+        else:
+            rendered = [render_symbol(value) for value in missing]
+            pooled = 0
+
+        for value, png in zip(missing, rendered):
+            self.symbols.set(value, png, 'image/png', ('symbols',))
+            found[value] = png
+        with self._lock:
+            self._rendered += len(missing)
+            self._pooled += pooled
+        return found
+
+    def pdf(self, labels):
+        """A4 PDF of ``labels`` (dicts with ``name``, ``price`` and ``barcode``)"""
+        symbols = self.get_symbols(label['barcode'] for label in labels)
+        images = {value: ImageReader(io.BytesIO(png)) for value, png in symbols.items()}
+
+        buffer = io.BytesIO()
+        page_width, page_height = A4
+        label_width = page_width / SHEET_COLUMNS
+        label_height = page_height / SHEET_ROWS
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        for index, label in enumerate(labels):
+            if index and index % LABELS_PER_SHEET == 0:
+                pdf.showPage()
+            slot = index % LABELS_PER_SHEET
+            x = (slot % SHEET_COLUMNS) * label_width
+            y = page_height - (slot // SHEET_COLUMNS + 1) * label_height
+
+            pdf.setFont('Helvetica-Bold', 8)
+            pdf.drawString(x + 4 * mm, y + label_height - 6 * mm, label['name'][:38])
+            pdf.setFont('Helvetica', 8)
+            pdf.drawRightString(x + label_width - 4 * mm, y + label_height - 10 * mm,
+                                f"Rs. {label['price']:.2f}")
+            pdf.drawImage(images[label['barcode']], x + 4 * mm, y + 3 * mm,
+                          width=label_width - 8 * mm, height=label_height - 15 * mm,
+                          preserveAspectRatio=True)
+        pdf.save()
+        buffer.seek(0)
+        return buffer
+
+    def png(self, labels, page=1):
+        """One sheet of ``labels`` as a PNG at ``PNG_DPI``"""
+        page_labels = labels[(page - 1) * LABELS_PER_SHEET:page * LABELS_PER_SHEET]
+        symbols = self.get_symbols(label['barcode'] for label in page_labels)
+
+        page_width, page_height = (round(size / 72 * PNG_DPI) for size in A4)
+        label_width = page_width // SHEET_COLUMNS
+        label_height = page_height // SHEET_ROWS
+        margin = round(4 * mm / 72 * PNG_DPI)
+        sheet = Image.new('RGB', (page_width, page_height), 'white')
+        draw = ImageDraw.Draw(sheet)
+        font = ImageFont.load_default(size=round(8 / 72 * PNG_DPI))  # 8 pt, as on the PDF
+        for slot, label in enumerate(page_labels):
+            x = (slot % SHEET_COLUMNS) * label_width
+            y = (slot // SHEET_COLUMNS) * label_height
+            draw.text((x + margin, y + margin), label['name'][:38], fill='black', font=font)
+            draw.text((x + margin, y + margin + font.size + 4), f"Rs. {label['price']:.2f}", fill='black', font=font)
+
+            symbol = Image.open(io.BytesIO(symbols[label['barcode']]))
+            text_height = 2 * (font.size + 4)
+            symbol.thumbnail((label_width - 2 * margin, label_height - 2 * margin - text_height))
+            sheet.paste(symbol, (x + margin, y + margin + text_height))
+
+        buffer = io.BytesIO()
+        sheet.save(buffer, format='PNG')
+        buffer.seek(0)
+        return buffer
+
+    def stats(self):
+        with self._lock:
+            return dict(self.symbols.stats(), rendered=self._rendered, rendered_in_pool=self._pooled,
+                        pool_started=self._pool is not None)
+
+
+label_renderer = LabelRenderer()
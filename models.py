@@ -4,8 +4,9 @@ Database models for the Snacks Shop application
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     """User model for admin and cashier accounts"""
@@ -15,6 +16,7 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='cashier')  # admin or cashier
+    store_id = db.Column(db.String(32))  # home store; None = default store
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -44,13 +46,13 @@ class Product(db.Model):
     name = db.Column(db.String(200), nullable=False, index=True)
     category = db.Column(db.String(50), nullable=False, index=True)  # chips, sweets, bakery, drinks
     price = db.Column(db.Float, nullable=False)
-    stock_quantity = db.Column(db.Integer, default=0, nullable=False)
+    stock_quantity = db.Column(db.Integer, default=0, nullable=False, index=True)
     description = db.Column(db.Text)
     image_url = db.Column(db.String(255))
     barcode = db.Column(db.String(100), unique=True, index=True)
     is_available = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
@@ -63,12 +65,45 @@ class Product(db.Model):
         return f'<Product {self.name}>'
 
 
+class ProductTombstone(db.Model):
+    """Record of a deleted product so catalog sync can tell terminals to drop it"""
+    __tablename__ = 'product_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<ProductTombstone {self.product_id}>'
+
+
+class Customer(db.Model):
+    """Customer ledger keyed by normalized phone number, with running totals"""
+    __tablename__ = 'customers'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    phone = db.Column(db.String(20), unique=True, nullable=False, index=True)  # digits only
+    name = db.Column(db.String(200))
+    visit_count = db.Column(db.Integer, nullable=False, default=0)
+    lifetime_spend = db.Column(db.Float, nullable=False, default=0.0)
+    first_visit = db.Column(db.DateTime, default=datetime.utcnow)
+    last_visit = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<Customer {self.phone}>'
+
+
 class Order(db.Model):
     """Order model for bills/invoices"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        # A customer's recent orders, newest first, without scanning orders
+        db.Index('ix_orders_customer_recent', 'customer_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    idempotency_key = db.Column(db.String(64), unique=True, index=True)  # client-generated, dedupes retries
     customer_name = db.Column(db.String(200))
     customer_phone = db.Column(db.String(20))
     subtotal = db.Column(db.Float, nullable=False, default=0.0)
@@ -77,10 +112,14 @@ class Order(db.Model):
     total_amount = db.Column(db.Float, nullable=False, default=0.0)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    store_id = db.Column(db.String(32))
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'))
     
     # Relationships
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     
+    is_archived = False
+    
     def __repr__(self):
         return f'<Order {self.invoice_number}>'
 
@@ -90,16 +129,143 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
+    discount_amount = db.Column(db.Float, nullable=False, default=0.0, server_default='0')  # from offers
+    offer_id = db.Column(db.Integer)  # offer that priced this line, if any
     
     def __repr__(self):
         return f'<OrderItem {self.id}>'
 
 
+class ArchivedOrder(db.Model):
+    """Order moved out of the hot ``orders`` table once its month was closed"""
+    __tablename__ = 'orders_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)  # same id as the original order
+    invoice_number = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    idempotency_key = db.Column(db.String(64), unique=True, index=True)
+    customer_name = db.Column(db.String(200))
+    customer_phone = db.Column(db.String(20))
+    subtotal = db.Column(db.Float, nullable=False, default=0.0)
+    tax_amount = db.Column(db.Float, nullable=False, default=0.0)
+    discount_amount = db.Column(db.Float, nullable=False, default=0.0)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, index=True)
+    store_id = db.Column(db.String(32))
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'))
+    
+    # Relationships
+    items = db.relationship('ArchivedOrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    user = db.relationship('User')
+    
+    is_archived = True
+    
+    def __repr__(self):
+        return f'<ArchivedOrder {self.invoice_number}>'
+
+
+class ArchivedOrderItem(db.Model):
+    """OrderItem belonging to an archived order"""
+    __tablename__ = 'order_items_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders_archive.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    total_price = db.Column(db.Float, nullable=False)
+    discount_amount = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    offer_id = db.Column(db.Integer)
+    
+    # Relationships
+    product = db.relationship('Product')
+    
+    def __repr__(self):
+        return f'<ArchivedOrderItem {self.id}>'
+
+
+class ArchivedMonth(db.Model):
+    """Calendar month whose orders have been moved to the archive tables"""
+    __tablename__ = 'archived_months'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), unique=True, nullable=False, index=True)  # YYYY-MM
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArchivedMonth {self.month}>'
+
+
+class OrderEvent(db.Model):
+    """Append-only journal of order events; ``seq`` only ever increases"""
+    __tablename__ = 'order_events'
+    __table_args__ = {'sqlite_autoincrement': True}  # never reuse a sequence number
+    
+    seq = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(30), nullable=False)  # order.created, order.deleted
+    order_id = db.Column(db.Integer, nullable=False)
+    store_id = db.Column(db.String(32))
+    payload = db.Column(db.Text, nullable=False)  # JSON snapshot of the order
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<OrderEvent {self.seq} {self.event_type}>'
+
+
+class DailySummary(db.Model):
+    """Frozen end-of-day (Z-report) totals for a closed business day"""
+    __tablename__ = 'daily_summaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    business_date = db.Column(db.Date, unique=True, nullable=False, index=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Float, nullable=False, default=0.0)
+    tax_amount = db.Column(db.Float, nullable=False, default=0.0)
+    discount_amount = db.Column(db.Float, nullable=False, default=0.0)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    closed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DailySummary {self.business_date}>'
+
+
+class DailyProductSummary(db.Model):
+    """Per-product quantities sold on a closed business day"""
+    __tablename__ = 'daily_product_summaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    business_date = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    product_name = db.Column(db.String(200), nullable=False)  # name at closing time
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def __repr__(self):
+        return f'<DailyProductSummary {self.business_date} {self.product_name}>'
+
+
+class DailyCashierSummary(db.Model):
+    """Per-cashier order counts and sales on a closed business day"""
+    __tablename__ = 'daily_cashier_summaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    business_date = db.Column(db.Date, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    username = db.Column(db.String(80), nullable=False)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def __repr__(self):
+        return f'<DailyCashierSummary {self.business_date} {self.username}>'
+
+
 class Setting(db.Model):
     """Setting model for system configuration"""
     __tablename__ = 'settings'
@@ -126,6 +292,69 @@ class Offer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Pricing rule; offers without a rule_type are display-only
+    rule_type = db.Column(db.String(20))  # 'percent', 'amount' (off each unit) or 'buy_get'
+    applies_to = db.Column(db.String(20))  # 'all', 'category' or 'product'
+    target_category = db.Column(db.String(100))
+    target_product_id = db.Column(db.Integer)
+    discount_value = db.Column(db.Float)
+    min_quantity = db.Column(db.Integer)  # line quantity needed for the offer
+    buy_quantity = db.Column(db.Integer)  # buy_get: buy this many...
+    free_quantity = db.Column(db.Integer)  # ...and get this many free
+    start_time = db.Column(db.String(5))  # daily window, 'HH:MM' local time
+    end_time = db.Column(db.String(5))
+    weekdays = db.Column(db.String(20))  # e.g. '5,6' for weekends (Monday = 0)
+    valid_from = db.Column(db.Date)
+    valid_until = db.Column(db.Date)
+    
+    RULE_FIELDS = ('rule_type', 'applies_to', 'target_category', 'target_product_id', 'discount_value',
+                   'min_quantity', 'buy_quantity', 'free_quantity', 'start_time', 'end_time',
+                   'weekdays', 'valid_from', 'valid_until')
+    
+    def rule_fields(self):
+        """Pricing rule as form values (for the admin edit form)"""
+        fields = {}
+        for name in self.RULE_FIELDS:
+            value = getattr(self, name)
+            fields[name] = value.isoformat() if hasattr(value, 'isoformat') else value
+        return fields
+    
     def __repr__(self):
         return f'<Offer {self.title}>'
 
+
+
+def upgrade_schema(engine=None, tables=None):
+    """Add columns and indexes that were declared after a table was created.
+
+    ``db.create_all()`` only creates missing tables, so databases created by an
+    older version of the app would otherwise never get new columns or indexes.
+    New columns must be nullable or carry a server default. ``engine`` and
+    ``tables`` default to the main database and every model (store shards
+    pass their own).
+    """
+    engine = engine or db.engine
+    tables = tables or db.metadata.sorted_tables
+    inspector = db.inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    if isinstance(default, str):
+                        default = "'" + default.replace("'", "''") + "'"
+                    else:
+                        default = default.text
+                    ddl += f' DEFAULT {default}'
+                conn.execute(db.text(ddl))
+    for table in tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
@@ -0,0 +1,118 @@
+"""
+Group-commit writer for checkouts
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from flask import current_app
+from models import db
+from stores import use_store
+from events import publish_orders
+from journal import ORDER_CREATED, order_journal
+from customers import attach_customer
+
+
+class OrderWriter:
+    """Single writer thread that commits submitted orders in small batches.
+
+    Request threads validate and price an order, then hand the unsaved
+    ``Order`` to ``submit``. The writer collects up to ``max_batch`` orders,
+    waiting at most ``max_delay`` seconds after the first one, and commits
+    them in one transaction, so concurrent tills share a commit instead of
+    queuing on the SQLite write lock. Each caller's future resolves to
+    ``(order id, invoice number)`` or to the error of its own order.
+    """
+
+    def __init__(self, max_batch=50, max_delay=0.005):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._app = None
+        self._batches = 0
+        self._orders = 0
+
+    def submit(self, order):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((order, future))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._app = current_app._get_current_object()
+                    self._thread = threading.Thread(target=self._run, name='order-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Past the deadline, only take what is already queued
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._app.app_context():
+                self._write(batch)
+
+    def _write(self, batch):
+        by_store = {}
+        for order, future in batch:
+            if future.set_running_or_notify_cancel():
+                by_store.setdefault(order.store_id, []).append((order, future))
+
+        for store, entries in by_store.items():
+            with use_store(store):
+                try:
+                    self._commit(entries)
+                except Exception:
+                    db.session.rollback()
+                    # One bad order (e.g. a duplicate idempotency key) must not
+                    # fail the rest of the batch: retry them one by one
+                    for entry in entries:
+                        try:
+                            self._commit([entry])
+                        except Exception as e:
+                            db.session.rollback()
+                            entry[1].set_exception(e)
+
+    def _commit(self, entries):
+        orders = [order for order, _ in entries]
+        for order in orders:
+            attach_customer(order)
+        db.session.add_all(orders)
+        db.session.flush()
+        results = [(order.id, order.invoice_number) for order in orders]
+        db.session.commit()
+        with self._lock:
+            self._batches += 1
+            self._orders += len(orders)
+        for (_, future), result in zip(entries, results):
+            future.set_result(result)
+        try:
+            order_journal.record_orders(ORDER_CREATED, orders)
+            publish_orders(orders)
+        except Exception:
+            # Journal and live dashboard updates are best effort; the orders are saved
+            db.session.rollback()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._thread is not None,
+                'pending': self._queue.qsize(),
+                'batches': self._batches,
+                'orders': self._orders,
+                'average_batch': round(self._orders / self._batches, 2) if self._batches else 0.0
+            }
+
+
+order_writer = OrderWriter()
@@ -0,0 +1,127 @@
+"""
+Rendered page cache for the public pages
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, session, Response, current_app
+
+
+class PageCache:
+    """Memory-bounded LRU cache of rendered pages, invalidated by tag.
+
+    Entries are keyed by endpoint plus normalized query arguments and carry
+    tags (``products``, ``offers``, ``settings``) that admin writes drop.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (body, mimetype, tags, expires_at)
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry[3] is not None and entry[3] < time.monotonic():
+                self._remove(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def set(self, key, body, mimetype, tags, ttl=None):
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, mimetype, frozenset(tags), expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry[0])
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying one of the given tags"""
+        tags = set(tags)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[2] & tags]
+            for key in stale:
+                self._remove(key)
+            self._invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations
+            }
+
+
+page_cache = PageCache()
+
+
+def _normalize(value):
+    return ' '.join(value.split())
+
+
+def cached_page(tags, args=None, ttl=None):
+    """Decorator to serve a public GET route from the page cache.
+
+    ``args`` maps the query arguments that affect the page to their defaults;
+    other arguments are ignored for the key. Logged-in users see
+    session-specific navigation, so only anonymous requests are cached.
+    """
+    args = args or {}
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*view_args, **view_kwargs):
+            if (request.method != 'GET' or 'user_id' in session or '_flashes' in session
+                    or not current_app.config.get('PAGE_CACHE_ENABLED', True)):
+                return f(*view_args, **view_kwargs)
+
+            key = (request.endpoint, tuple(sorted(view_kwargs.items())),
+                   tuple(_normalize(request.args.get(name, default)) or default
+                         for name, default in sorted(args.items())))
+            entry = page_cache.get(key)
+            if entry is not None:
+                return Response(entry[0], mimetype=entry[1])
+
+            rv = f(*view_args, **view_kwargs)
+            if isinstance(rv, str):
+                body = rv.encode('utf-8')
+                page_cache.set(key, body, 'text/html', tags, ttl=ttl)
+                return Response(body, mimetype='text/html')
+            return rv
+        return decorated_function
+    return decorator
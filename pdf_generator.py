@@ -83,9 +83,12 @@ def generate_invoice_pdf(order):
     items_data = [['S.No', 'Item', 'Qty', 'Unit Price', 'Total']]
     
     for idx, item in enumerate(order.items, 1):
+        name = item.product.name
+        if item.discount_amount:
+            name += f" (offer -₹{item.discount_amount:.2f})"
         items_data.append([
             str(idx),
-            item.product.name,
+            name,
             str(item.quantity),
             f"₹{item.unit_price:.2f}",
             f"₹{item.total_price:.2f}"
@@ -0,0 +1,348 @@
+"""
+Bulk product import and export (CSV, JSON Lines and JSON arrays)
+"""
+import csv
+import io
+import json
+import re
+from datetime import datetime
+from sqlalchemy import insert, select, update
+from models import db, Product
+
+EXPORT_COLUMNS = ['id', 'name', 'category', 'price', 'stock_quantity', 'description',
+                  'image_url', 'barcode', 'is_available']
+TEXT_FIELDS = ('name', 'category', 'description', 'image_url')
+IMPORT_FIELDS = ['name', 'category', 'price', 'stock_quantity', 'description',
+                 'image_url', 'barcode', 'is_available']
+TEXT_FIELDS = ('name', 'category', 'description', 'image_url')
+DEFAULT_STOCK_QUANTITY = 999  # Stock is not tracked, same default as admin_products_add
+MAX_REPORTED_ERRORS = 1000
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+class ImportFormatError(Exception):
+    """Raised when an upload cannot be parsed at all"""
+
+
+def detect_format(filename, requested=None):
+    """Pick the import/export format from an explicit value or the file extension"""
+    fmt = (requested or '').lower()
+    if not fmt and filename:
+        fmt = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if fmt in ('ndjson', 'jsonlines'):
+        fmt = 'jsonl'
+    if fmt not in ('csv', 'json', 'jsonl'):
+        raise ImportFormatError('Unsupported format, use csv, json or jsonl')
+    return fmt
+
+
+# ==================== Parsing ====================
+
+def _iter_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _iter_jsonl(stream):
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ValueError(f'Invalid JSON: {e.msg}')
+
+
+def _iter_json_array(stream, chunk_size=64 * 1024):
+    """Incrementally decode a top-level JSON array without loading it whole"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    index = 0
+
+    def refill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        buffer, pos = buffer[pos:] + chunk, 0
+        eof = not chunk
+
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos >= len(buffer):
+            if eof:
+                raise ImportFormatError('Unexpected end of JSON array')
+            refill()
+            continue
+
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                raise ImportFormatError('Expected a JSON array of products')
+            pos += 1
+            started = True
+            continue
+        if char == ']':
+            return
+        if char == ',':
+            pos += 1
+            continue
+
+        try:
+            obj, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Most likely an element split across chunks
+            if eof:
+                raise ImportFormatError(f'Invalid JSON near element {index + 1}')
+            refill()
+            continue
+        index += 1
+        yield index, obj
+        pos = end
+
+
+def iter_rows(binary_stream, fmt):
+    """Yield ``(line number, row dict)`` from an uploaded file stream"""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        return _iter_csv(text)
+    if fmt == 'jsonl':
+        return _iter_jsonl(text)
+    return _iter_json_array(text)
+
+
+# ==================== Validation ====================
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ('1', 'true', 'yes', 'y', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'n', 'off'):
+        return False
+    raise ValueError(f'Invalid boolean: {value}')
+
+
+def validate_row(raw):
+    """Normalize one input row into Product column values or raise ValueError"""
+    if isinstance(raw, Exception):
+        raise raw
+    if not isinstance(raw, dict):
+        raise ValueError('Row must be an object')
+
+    row = {}
+    for field in IMPORT_FIELDS:
+        value = raw.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is not None and value != '':
+            row[field] = value
+
+    for field in TEXT_FIELDS:
+        if field in row and not isinstance(row[field], str):
+            raise ValueError(f'{field} must be text')
+    if not row.get('name'):
+        raise ValueError('name is required')
+    if len(row['name']) > 200:
+        raise ValueError('name is longer than 200 characters')
+    if not row.get('category'):
+        raise ValueError('category is required')
+    if len(row['category']) > 50:
+        raise ValueError('category is longer than 50 characters')
+
+    try:
+        row['price'] = float(row['price'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('price must be a number')
+    if row['price'] < 0:
+        raise ValueError('price must not be negative')
+
+    if 'stock_quantity' in row:
+        try:
+            row['stock_quantity'] = int(float(row['stock_quantity']))
+        except (TypeError, ValueError):
+            raise ValueError('stock_quantity must be an integer')
+    if 'is_available' in row:
+        row['is_available'] = _parse_bool(row['is_available'])
+    if 'barcode' in row:
+        row['barcode'] = str(row['barcode'])
+        if len(row['barcode']) > 100:
+            raise ValueError('barcode is longer than 100 characters')
+    return row
+
+
+# ==================== Upsert ====================
+
+def _dialect_insert(table):
+    """INSERT that supports ON CONFLICT on the current database"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(table)
+
+
+def _upsert_chunk(rows):
+    """Write one validated chunk; returns (inserted, updated, row errors).
+
+    Rows are matched by barcode first, then by exact name for rows without a
+    known barcode: a row without a barcode matches any product of that name,
+    a row with a new barcode only one that has no barcode yet. Name matches
+    become a bulk UPDATE by primary key, the rest go through a single
+    ``INSERT ... ON CONFLICT (barcode) DO UPDATE``.
+    """
+    barcodes = {row['barcode'] for _, row in rows if row.get('barcode')}
+    names = {row['name'] for _, row in rows}
+
+    by_barcode = {}
+    if barcodes:
+        by_barcode = dict(db.session.execute(
+            select(Product.barcode, Product.id).where(Product.barcode.in_(barcodes))
+        ).all())
+    by_name = {}
+    for name, product_id, product_barcode in db.session.execute(
+        select(Product.name, Product.id, Product.barcode).where(Product.name.in_(names))
+    ).all():
+        by_name.setdefault(name, []).append((product_id, product_barcode))
+
+    now = datetime.utcnow()
+    updates = {}
+    upserts = {}
+    inserted = updated = 0
+    errors = []
+    for line_no, row in rows:
+        barcode = row.get('barcode')
+        matches = by_name.get(row['name'], [])
+        if barcode:
+            # A product that already has another barcode is a different product
+            matches = [match for match in matches if match[1] is None]
+        if barcode and barcode in by_barcode:
+            updated += 1
+        elif matches:
+            if len(matches) > 1:
+                # Several products sharing a name cannot be matched safely
+                errors.append({'line': line_no, 'error': f"Several products are named {row['name']!r}"})
+                continue
+            product_id = matches[0][0]
+            updates.setdefault(tuple(sorted(row)), []).append(dict(row, id=product_id, updated_at=now))
+            updated += 1
+            continue
+        else:
+            inserted += 1
+        values = dict(row, updated_at=now)
+        values.setdefault('stock_quantity', DEFAULT_STOCK_QUANTITY)
+        values.setdefault('is_available', True)
+        # Group by the columns supplied so each statement is uniform and a
+        # conflict only overwrites what the row actually provided
+        upserts.setdefault(tuple(sorted(row)), []).append(values)
+
+    for group in updates.values():
+        db.session.execute(update(Product), group)
+
+    for supplied, group in upserts.items():
+        stmt = _dialect_insert(Product.__table__)
+        if stmt is None or 'barcode' not in supplied:
+            stmt = insert(Product.__table__)
+        else:
+            columns = [c for c in supplied if c != 'barcode'] + ['updated_at']
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['barcode'],
+                set_={c: getattr(stmt.excluded, c) for c in columns}
+            )
+        db.session.execute(stmt, group)
+
+    return inserted, updated, errors
+
+
+def import_products(row_iter, batch_size=2000):
+    """Validate and upsert rows in batches, committing once per batch.
+
+    Returns a report with insert/update counts and per-row errors. A file
+    that turns out to be malformed part-way stops the import: the rows read
+    before that point are still imported and the error is reported as
+    ``format_error``.
+    """
+    report = {'inserted': 0, 'updated': 0, 'error_count': 0, 'errors': []}
+
+    def add_error(line_no, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_no, 'error': message})
+
+    def flush(chunk):
+        # Later rows for the same barcode/name win within a chunk
+        latest = {}
+        for line_no, row in chunk:
+            latest[row.get('barcode') or ('name', row['name'])] = (line_no, row)
+        try:
+            inserted, updated, errors = _upsert_chunk(list(latest.values()))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for line_no, _ in chunk:
+                add_error(line_no, f'Batch failed: {e}')
+            return
+        report['inserted'] += inserted
+        report['updated'] += updated
+        for error in errors:
+            add_error(error['line'], error['error'])
+
+    chunk = []
+    try:
+        for line_no, raw in row_iter:
+            try:
+                chunk.append((line_no, validate_row(raw)))
+            except ValueError as e:
+                add_error(line_no, str(e))
+                continue
+            if len(chunk) >= batch_size:
+                flush(chunk)
+                chunk = []
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        # Earlier batches are committed already; keep the report consistent with them
+        report['format_error'] = str(e)
+    if chunk:
+        flush(chunk)
+    return report
+
+
+# ==================== Export ====================
+
+def _iter_export_rows(yield_per=1000):
+    columns = [getattr(Product, name) for name in EXPORT_COLUMNS]
+    result = db.session.execute(
+        select(*columns).order_by(Product.id).execution_options(yield_per=yield_per)
+    )
+    for row in result:
+        yield dict(zip(EXPORT_COLUMNS, row))
+
+
+def export_products(fmt):
+    """Yield the catalog as CSV, JSON Lines or a JSON array, one chunk at a time"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for index, row in enumerate(_iter_export_rows(), 1):
+            writer.writerow(row)
+            if index % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    elif fmt == 'jsonl':
+        for row in _iter_export_rows():
+            yield json.dumps(row) + '\n'
+    else:
+        yield '['
+        for index, row in enumerate(_iter_export_rows()):
+            yield (',\n' if index else '\n') + json.dumps(row)
+        yield '\n]\n'
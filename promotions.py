@@ -0,0 +1,233 @@
+"""
+Rule-based offer pricing for checkout
+"""
+import threading
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from itertools import chain
+from sqlalchemy import func
+from models import db, Offer
+
+RULE_TYPES = ('percent', 'amount', 'buy_get')
+TARGETS = ('all', 'category', 'product')
+
+LineDiscount = namedtuple('LineDiscount', ['offer_id', 'title', 'amount'])
+
+
+class PromotionError(Exception):
+    """Raised when an offer's pricing rule is invalid"""
+
+
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M').time() if value else None
+
+
+class Rule:
+    """An active offer compiled for evaluation against cart lines"""
+
+    __slots__ = ('offer_id', 'title', 'rule_type', 'value', 'min_quantity', 'buy', 'free',
+                 'start', 'end', 'weekdays', 'valid_from', 'valid_until')
+
+    def __init__(self, offer):
+        self.offer_id = offer.id
+        self.title = offer.title
+        self.rule_type = offer.rule_type
+        self.value = offer.discount_value or 0.0
+        self.min_quantity = offer.min_quantity or 1
+        self.buy = offer.buy_quantity or 0
+        self.free = offer.free_quantity or 0
+        self.start = _parse_time(offer.start_time)
+        self.end = _parse_time(offer.end_time)
+        self.weekdays = ({int(day) for day in offer.weekdays.split(',') if day.strip()}
+                         if offer.weekdays else None)
+        self.valid_from = offer.valid_from
+        self.valid_until = offer.valid_until
+
+    def is_active(self, when):
+        """Whether the offer applies at local time ``when``"""
+        day = when.date()
+        if self.valid_from and day < self.valid_from:
+            return False
+        if self.valid_until and day > self.valid_until:
+            return False
+        if self.weekdays is not None and when.weekday() not in self.weekdays:
+            return False
+        if self.start and self.end:
+            now = when.time()
+            if self.start <= self.end:
+                return self.start <= now < self.end
+            # Window crossing midnight, e.g. 22:00 - 02:00
+            return now >= self.start or now < self.end
+        return True
+
+    def discount(self, unit_price, quantity):
+        """Discount on one cart line, never more than the line total"""
+        if quantity < self.min_quantity:
+            return 0.0
+        line_total = unit_price * quantity
+        if self.rule_type == 'percent':
+            amount = line_total * self.value / 100
+        elif self.rule_type == 'amount':
+            amount = min(self.value, unit_price) * quantity
+        elif self.rule_type == 'buy_get' and self.buy > 0 and self.free > 0:
+            amount = unit_price * (quantity // (self.buy + self.free)) * self.free
+        else:
+            amount = 0.0
+        return round(min(max(amount, 0.0), line_total), 2)
+
+
+class PromotionIndex:
+    """Active rules bucketed by product and category.
+
+    Pricing a line only looks at the rules that can match it, so the cost of
+    a cart grows with its lines rather than with the number of offers.
+    """
+
+    def __init__(self, offers):
+        self.by_product = defaultdict(list)
+        self.by_category = defaultdict(list)
+        self.everywhere = []
+        self.size = 0
+        for offer in offers:
+            rule = Rule(offer)
+            if offer.applies_to == 'product':
+                self.by_product[offer.target_product_id].append(rule)
+            elif offer.applies_to == 'category':
+                self.by_category[offer.target_category].append(rule)
+            else:
+                self.everywhere.append(rule)
+            self.size += 1
+
+    def candidates(self, product):
+        return chain(self.by_product.get(product.id, ()),
+                     self.by_category.get(product.category, ()),
+                     self.everywhere)
+
+
+class PromotionEngine:
+    """Prices cart lines with the best applicable offer per line.
+
+    Offers do not stack: each line gets the single largest discount. The
+    index is compiled once per offers version (row count and latest
+    ``updated_at``), so every worker process picks up admin edits on its
+    next checkout without re-reading the rules each time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = None
+
+    def _current_version(self):
+        return tuple(db.session.query(func.count(Offer.id), func.max(Offer.updated_at)).one())
+
+    def index(self):
+        version = self._current_version()
+        with self._lock:
+            if self._index is None or version != self._version:
+                offers = Offer.query.filter(Offer.is_active.is_(True), Offer.rule_type.isnot(None)).all()
+                self._index = PromotionIndex(offers)
+                self._version = version
+            return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def price(self, items, when=None):
+        """Best discount for each ``(product, quantity, unit_price)`` line.
+
+        Returns a list aligned with ``items`` holding a ``LineDiscount`` or
+        None; ``when`` is the local time of the sale (default now).
+        """
+        items = list(items)
+        index = self.index()
+        if not index.size:
+            return [None] * len(items)
+
+        when = when or datetime.now()
+        discounts = []
+        for product, quantity, unit_price in items:
+            best = None
+            for rule in index.candidates(product):
+                if not rule.is_active(when):
+                    continue
+                amount = rule.discount(unit_price, quantity)
+                if amount > 0 and (best is None or amount > best.amount):
+                    best = LineDiscount(rule.offer_id, rule.title, amount)
+            discounts.append(best)
+        return discounts
+
+
+promotions = PromotionEngine()
+
+
+def _optional(form, name, convert):
+    value = (form.get(name) or '').strip()
+    if not value:
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        raise PromotionError(f'Invalid value for {name.replace("_", " ")}')
+
+
+def parse_rule(form):
+    """Read offer rule fields from a submitted form into Offer column values"""
+    rule_type = (form.get('rule_type') or '').strip() or None
+    if rule_type is None:
+        return {name: None for name in Offer.RULE_FIELDS}
+    if rule_type not in RULE_TYPES:
+        raise PromotionError('Unknown offer type')
+
+    applies_to = (form.get('applies_to') or 'all').strip()
+    if applies_to not in TARGETS:
+        raise PromotionError('Unknown offer target')
+
+    rule = {
+        'rule_type': rule_type,
+        'applies_to': applies_to,
+        'target_category': (form.get('target_category') or '').strip() or None,
+        'target_product_id': _optional(form, 'target_product_id', int),
+        'discount_value': _optional(form, 'discount_value', float),
+        'min_quantity': _optional(form, 'min_quantity', int),
+        'buy_quantity': _optional(form, 'buy_quantity', int),
+        'free_quantity': _optional(form, 'free_quantity', int),
+        'start_time': _optional(form, 'start_time', lambda v: _parse_time(v).strftime('%H:%M')),
+        'end_time': _optional(form, 'end_time', lambda v: _parse_time(v).strftime('%H:%M')),
+        'weekdays': None,
+        'valid_from': _optional(form, 'valid_from', lambda v: datetime.strptime(v, '%Y-%m-%d').date()),
+        'valid_until': _optional(form, 'valid_until', lambda v: datetime.strptime(v, '%Y-%m-%d').date()),
+    }
+
+    weekdays = form.getlist('weekdays') if hasattr(form, 'getlist') else form.get('weekdays') or []
+    if isinstance(weekdays, str):
+        weekdays = weekdays.split(',')
+    days = sorted({int(day) for day in weekdays if str(day).strip().isdigit() and 0 <= int(day) <= 6})
+    if days and len(days) < 7:
+        rule['weekdays'] = ','.join(str(day) for day in days)
+
+    # The form submits every field; keep only those the rule uses
+    if applies_to != 'category':
+        rule['target_category'] = None
+    if applies_to != 'product':
+        rule['target_product_id'] = None
+    if rule_type == 'buy_get':
+        rule['discount_value'] = None
+    else:
+        rule['buy_quantity'] = rule['free_quantity'] = None
+
+    if applies_to == 'category' and not rule['target_category']:
+        raise PromotionError('Choose a category for the offer')
+    if applies_to == 'product' and not rule['target_product_id']:
+        raise PromotionError('Choose a product for the offer')
+    if rule_type in ('percent', 'amount'):
+        value = rule['discount_value']
+        if value is None or value <= 0 or (rule_type == 'percent' and value > 100):
+            raise PromotionError('Enter a discount between 0 and 100%' if rule_type == 'percent'
+                                 else 'Enter a positive discount amount')
+    if rule_type == 'buy_get' and not ((rule['buy_quantity'] or 0) > 0 and (rule['free_quantity'] or 0) > 0):
+        raise PromotionError('Enter how many to buy and how many are free')
+    if (rule['start_time'] is None) != (rule['end_time'] is None):
+        raise PromotionError('Enter both a start and an end time')
+    return rule
@@ -0,0 +1,48 @@
+"""
+Column-only product read models for list views and JSON endpoints
+"""
+from sqlalchemy import func, select
+from models import db, Product
+from search import filter_by_search
+
+# Columns each list view renders; rows expose them as attributes (row.name)
+CARD_COLUMNS = (Product.id, Product.name, Product.category, Product.price,
+                Product.image_url, Product.barcode)
+MENU_COLUMNS = CARD_COLUMNS + (Product.description, Product.stock_quantity)
+ADMIN_COLUMNS = (Product.id, Product.name, Product.category, Product.price,
+                 Product.description, Product.image_url, Product.barcode)
+
+
+def product_rows(columns, category=None, search=None, available_only=True):
+    """SELECT of ``columns`` for a product list, filtered and ordered like the views.
+
+    Rows are plain tuples with named attributes, so no ORM instances are
+    built or tracked in the identity map.
+    """
+    stmt = select(*columns)
+    if available_only:
+        stmt = stmt.where(Product.is_available.is_(True))
+    if category and category != 'all':
+        stmt = stmt.where(Product.category == category)
+    if search:
+        return filter_by_search(stmt, search)
+    return stmt.order_by(Product.name)
+
+
+def fetch(stmt):
+    return db.session.execute(stmt).all()
+
+
+def product_categories():
+    return [row[0] for row in db.session.execute(select(Product.category).distinct())]
+
+
+def paginate(stmt, page, per_page):
+    """One page of a SELECT plus paging info, counted on the server"""
+    total = db.session.execute(
+        select(func.count()).select_from(stmt.order_by(None).subquery())
+    ).scalar()
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(max(page, 1), pages)
+    rows = fetch(stmt.limit(per_page).offset((page - 1) * per_page))
+    return {'items': rows, 'page': page, 'pages': pages, 'per_page': per_page, 'total': total}
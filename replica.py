@@ -0,0 +1,78 @@
+"""
+Read/write split: read-only routes query a secondary read-only database
+"""
+import threading
+from collections import Counter
+from functools import wraps
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request
+from stores import resolve_sqlite_url
+
+
+def read_only(f):
+    """Decorator to mark a route as read-only so its queries may use the read bind"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g._read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+class ReplicaRouter:
+    """Send SELECTs of read-only routes to ``SQLALCHEMY_READ_URI``.
+
+    Anything else goes to the primary: writes, statements of ordinary
+    routes, and every statement after a read-only route has written, so a
+    request always reads its own writes. Decisions are counted per endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine = None
+        self._decisions = Counter()  # (endpoint, target) -> statements
+
+    def enabled(self):
+        return bool(current_app.config.get('SQLALCHEMY_READ_URI'))
+
+    def route(self, session, clause=None):
+        """Engine for a statement, or None to use the primary"""
+        if not has_request_context():
+            return None
+        if not g.get('_read_only'):
+            self._record('primary')
+            return None
+        if clause is None or getattr(clause, 'is_dml', False):
+            # A flush or DML: this request reads from the primary from now on
+            session.info['wrote'] = True
+        if session.info.get('wrote') or not getattr(clause, 'is_select', False):
+            self._record('primary-pinned')
+            return None
+        if not self.enabled():
+            self._record('primary')
+            return None
+        self._record('replica')
+        return self.engine()
+
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = sa.create_engine(resolve_sqlite_url(current_app.config['SQLALCHEMY_READ_URI']))
+        return self._engine
+
+    def _record(self, target):
+        with self._lock:
+            self._decisions[(request.endpoint, target)] += 1
+
+    def stats(self):
+        with self._lock:
+            decisions = dict(self._decisions)
+        totals = Counter()
+        endpoints = {}
+        for (endpoint, target), count in decisions.items():
+            totals[target] += count
+            endpoints.setdefault(endpoint or '', {})[target] = count
+        return {'enabled': self.enabled(), 'totals': dict(totals), 'endpoints': endpoints}
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,208 @@
+"""
+End-of-day closing (Z-report) and sales reports over frozen daily summaries
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from models import (db, User, Product, Order, OrderItem, ArchivedOrder, ArchivedOrderItem,
+                    DailySummary, DailyProductSummary, DailyCashierSummary)
+from archive import needs_archive
+
+# (order model, item model) pairs a business day may be stored in
+ORDER_SOURCES = [(Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)]
+
+
+class ReportError(Exception):
+    """Raised when a day cannot be closed"""
+
+
+def day_bounds(day):
+    """Start and end datetimes of a business day (same convention as order history)"""
+    return datetime.combine(day, datetime.min.time()), datetime.combine(day, datetime.max.time())
+
+
+def is_day_closed(day):
+    return db.session.query(DailySummary.id).filter_by(business_date=day).first() is not None
+
+
+def _empty_totals():
+    return {'order_count': 0, 'subtotal': 0.0, 'tax_amount': 0.0,
+            'discount_amount': 0.0, 'total_amount': 0.0}
+
+
+def _as_date(value):
+    # date() returns a string on SQLite and a date on PostgreSQL
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def aggregate_days(start, end, skip_days=()):
+    """Aggregate raw orders between two datetimes, grouped by calendar day.
+
+    Returns ``{day: totals}`` for the days with orders, plus product and
+    cashier totals over the whole range. Orders on ``skip_days`` are left
+    out. Runs three grouped queries per order table, however long the range.
+    """
+    daily = {}
+    products = {}
+    cashiers = {}
+
+    sources = ORDER_SOURCES if needs_archive(start) else ORDER_SOURCES[:1]
+    for order_model, item_model in sources:
+        day = func.date(order_model.created_at)
+        in_range = (order_model.created_at >= start) & (order_model.created_at <= end)
+        if skip_days:
+            in_range = in_range & day.notin_([d.isoformat() for d in skip_days])
+
+        for row in db.session.query(
+            day,
+            func.count(order_model.id),
+            func.coalesce(func.sum(order_model.subtotal), 0.0),
+            func.coalesce(func.sum(order_model.tax_amount), 0.0),
+            func.coalesce(func.sum(order_model.discount_amount), 0.0),
+            func.coalesce(func.sum(order_model.total_amount), 0.0)
+        ).filter(in_range).group_by(day).all():
+            totals = daily.setdefault(_as_date(row[0]), _empty_totals())
+            for key, value in zip(totals, row[1:]):
+                totals[key] += value
+
+        product_rows = db.session.query(
+            item_model.product_id,
+            Product.name,
+            func.sum(item_model.quantity),
+            func.sum(item_model.total_price)
+        ).join(order_model, item_model.order_id == order_model.id).outerjoin(
+            Product, item_model.product_id == Product.id
+        ).filter(in_range).group_by(item_model.product_id, Product.name).all()
+        for product_id, name, quantity, revenue in product_rows:
+            entry = products.setdefault(product_id, {
+                'product_id': product_id,
+                'product_name': name or f'Deleted product #{product_id}',
+                'quantity': 0,
+                'revenue': 0.0
+            })
+            entry['quantity'] += quantity
+            entry['revenue'] += revenue
+
+        cashier_rows = db.session.query(
+            order_model.created_by,
+            User.username,
+            func.count(order_model.id),
+            func.sum(order_model.total_amount)
+        ).outerjoin(User, order_model.created_by == User.id).filter(
+            in_range
+        ).group_by(order_model.created_by, User.username).all()
+        for user_id, username, count, total in cashier_rows:
+            entry = cashiers.setdefault(user_id, {
+                'user_id': user_id,
+                'username': username or f'User #{user_id}',
+                'order_count': 0,
+                'total_amount': 0.0
+            })
+            entry['order_count'] += count
+            entry['total_amount'] += total
+
+    return daily, products, cashiers
+
+
+def aggregate_range(start, end):
+    """Aggregate raw orders between two datetimes into totals, products and cashiers"""
+    daily, products, cashiers = aggregate_days(start, end)
+    totals = _empty_totals()
+    for day_totals in daily.values():
+        for key in totals:
+            totals[key] += day_totals[key]
+    return totals, products, cashiers
+
+
+def close_day(day, user_id=None):
+    """Compute and freeze the summary of one business day.
+
+    Once closed, reports read the frozen rows, so later deletions no longer
+    change that day's history. Only past days can be closed: today still
+    takes orders.
+    """
+    if day >= datetime.now().date():
+        raise ReportError('Only past days can be closed; today is still taking orders')
+    if is_day_closed(day):
+        raise ReportError(f'{day.isoformat()} is already closed')
+
+    totals, products, cashiers = aggregate_range(*day_bounds(day))
+
+    summary = DailySummary(business_date=day, closed_by=user_id, **totals)
+    db.session.add(summary)
+    for entry in products.values():
+        db.session.add(DailyProductSummary(business_date=day, **entry))
+    for entry in cashiers.values():
+        db.session.add(DailyCashierSummary(business_date=day, **entry))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Closed concurrently by another request or command
+        db.session.rollback()
+        raise ReportError(f'{day.isoformat()} is already closed')
+    return summary
+
+
+def sales_report(start_day, end_day):
+    """Sales between two dates (inclusive).
+
+    Closed days come from the frozen summaries; the days that are still
+    open are aggregated from raw orders in one grouped pass.
+    """
+    summaries = {s.business_date: s for s in DailySummary.query.filter(
+        DailySummary.business_date >= start_day,
+        DailySummary.business_date <= end_day
+    ).all()}
+
+    days = []
+    totals = _empty_totals()
+    products = {}
+    cashiers = {}
+
+    def merge(target, entries, key, fields):
+        for entry in entries:
+            merged = target.setdefault(entry[key], dict(entry, **{f: 0 for f in fields}))
+            for field in fields:
+                merged[field] += entry[field]
+
+    # Frozen per-product/per-cashier rows for every closed day in one query each
+    closed_days = list(summaries)
+    if closed_days:
+        merge(products, [{
+            'product_id': p.product_id, 'product_name': p.product_name,
+            'quantity': p.quantity, 'revenue': p.revenue
+        } for p in DailyProductSummary.query.filter(
+            DailyProductSummary.business_date.in_(closed_days)).all()],
+            'product_id', ('quantity', 'revenue'))
+        merge(cashiers, [{
+            'user_id': c.user_id, 'username': c.username,
+            'order_count': c.order_count, 'total_amount': c.total_amount
+        } for c in DailyCashierSummary.query.filter(
+            DailyCashierSummary.business_date.in_(closed_days)).all()],
+            'user_id', ('order_count', 'total_amount'))
+
+    open_daily = {}
+    if len(closed_days) < (end_day - start_day).days + 1:
+        open_daily, open_products, open_cashiers = aggregate_days(
+            day_bounds(start_day)[0], day_bounds(end_day)[1], skip_days=closed_days)
+        merge(products, open_products.values(), 'product_id', ('quantity', 'revenue'))
+        merge(cashiers, open_cashiers.values(), 'user_id', ('order_count', 'total_amount'))
+
+    day = start_day
+    while day <= end_day:
+        summary = summaries.get(day)
+        if summary:
+            day_totals = {key: getattr(summary, key) for key in totals}
+        else:
+            day_totals = open_daily.get(day) or _empty_totals()
+        for key in totals:
+            totals[key] += day_totals[key]
+        days.append(dict(day_totals, date=day, closed=summary is not None))
+        day += timedelta(days=1)
+
+    return {
+        'days': days,
+        'totals': totals,
+        'products': sorted(products.values(), key=lambda p: p['quantity'], reverse=True),
+        'cashiers': sorted(cashiers.values(), key=lambda c: c['total_amount'], reverse=True)
+    }
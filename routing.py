@@ -0,0 +1,22 @@
+"""
+Session routing between the main database, store shards and the read bind
+"""
+from flask_sqlalchemy.session import Session
+from stores import shard_router
+from replica import replica_router
+
+
+class RoutingSession(Session):
+    """Session that picks an engine per statement.
+
+    A store's order tables go to its shard (see stores.py); other SELECTs of
+    read-only routes go to the read bind (see replica.py); everything else
+    uses the main database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = shard_router.route(mapper, clause) or replica_router.route(self, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
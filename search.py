@@ -0,0 +1,154 @@
+"""
+Full-text product search backed by SQLite FTS5
+"""
+import difflib
+import re
+import threading
+from sqlalchemy.exc import OperationalError
+from models import db, Product
+
+FTS_SETUP = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, category,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts_vocab USING fts5vocab(products_fts, 'row')""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+]
+
+# Column weights for bm25(): name matches rank above description and category
+RANK_EXPRESSION = 'bm25(products_fts, 10.0, 2.0, 1.0)'
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+class ProductSearch:
+    """Ranked product search with prefix matching and a fuzzy fallback.
+
+    The FTS5 index is kept in sync with ``products`` by triggers, so admin
+    edits and bulk imports need no extra calls; only the vocabulary used for
+    fuzzy matching is cached and dropped by ``invalidate``. When the database
+    is not SQLite or the SQLite build lacks FTS5, ``match`` returns None and
+    callers fall back to a LIKE filter.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.available = None
+        self._vocabulary = None
+
+    def ensure(self):
+        """Create the FTS table and triggers if needed; returns availability"""
+        if self.available is not None:
+            return self.available
+        with self._lock:
+            if self.available is not None:
+                return self.available
+            if db.engine.dialect.name != 'sqlite':
+                self.available = False
+                return False
+            try:
+                with db.engine.begin() as conn:
+                    exists = conn.execute(db.text(
+                        "SELECT 1 FROM sqlite_master WHERE name = 'products_fts'"
+                    )).first() is not None
+                    for statement in FTS_SETUP:
+                        conn.execute(db.text(statement))
+                    if not exists:
+                        # Index products that existed before the triggers
+                        conn.execute(db.text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+                self.available = True
+            except OperationalError:
+                # e.g. "no such module: fts5"
+                self.available = False
+            return self.available
+
+    @staticmethod
+    def _match_query(token_groups):
+        """Build an FTS5 MATCH expression; every group must match, any term in a group may"""
+        parts = []
+        for group in token_groups:
+            terms = ' OR '.join(f'"{token}"*' for token in group)
+            parts.append(f'({terms})' if len(group) > 1 else terms)
+        return ' AND '.join(parts)
+
+    def _has_match(self, match):
+        return db.session.execute(db.text(
+            'SELECT 1 FROM products_fts WHERE products_fts MATCH :match LIMIT 1'
+        ), {'match': match}).first() is not None
+
+    def _get_vocabulary(self):
+        vocabulary = self._vocabulary
+        if vocabulary is None:
+            vocabulary = [row[0] for row in db.session.execute(db.text('SELECT term FROM products_fts_vocab'))]
+            self._vocabulary = vocabulary
+        return vocabulary
+
+    def invalidate(self):
+        """Forget the cached index vocabulary after catalog writes"""
+        self._vocabulary = None
+
+    def _fuzzy_groups(self, tokens):
+        """Replace each token with close index terms (typo tolerance)"""
+        vocabulary = self._get_vocabulary()
+        groups = []
+        for token in tokens:
+            matches = difflib.get_close_matches(token, vocabulary, n=3, cutoff=0.7)
+            if not matches:
+                return None
+            groups.append(matches)
+        return groups
+
+    def match(self, term):
+        """FTS5 MATCH expression for ``term``, falling back to close terms when
+        nothing matches exactly; '' when nothing matches at all and None when
+        FTS is unavailable"""
+        tokens = [token.lower() for token in _TOKEN.findall(term or '')]
+        if not tokens or not self.ensure():
+            return None
+
+        match = self._match_query([[token] for token in tokens])
+        if self._has_match(match):
+            return match
+        groups = self._fuzzy_groups(tokens)
+        return self._match_query(groups) if groups else ''
+
+    def ranked(self, match):
+        """Subquery of (id, rank) for every product matching ``match``; lower rank is better"""
+        return db.text(
+            f'SELECT rowid AS id, {RANK_EXPRESSION} AS rank FROM products_fts '
+            f'WHERE products_fts MATCH :match'
+        ).bindparams(match=match).columns(id=db.Integer, rank=db.Float).subquery('product_matches')
+
+
+product_search = ProductSearch()
+
+
+def filter_by_search(query, search):
+    """Apply a search term to a Product query and order the results.
+
+    Uses the FTS5 ranking when available, joined into the query so paging
+    applies to every match; otherwise the original name LIKE filter in
+    alphabetical order.
+    """
+    match = product_search.match(search)
+    if match is None:
+        return query.filter(Product.name.ilike(f'%{search}%')).order_by(Product.name)
+    if not match:
+        return query.filter(db.false())
+    ranked = product_search.ranked(match)
+    return query.join(ranked, ranked.c.id == Product.id).order_by(ranked.c.rank, Product.id)
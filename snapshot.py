@@ -0,0 +1,134 @@
+"""
+Pre-rendered static snapshot of the public pages
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlencode
+from flask import current_app
+from read_models import MENU_COLUMNS, product_rows, fetch, product_categories
+
+
+def snapshot_name(category):
+    """File name of a menu category in the snapshot (``all`` for the full menu)"""
+    return quote(category, safe='')
+
+
+class StaticSnapshot:
+    """Renders ``/`` and every ``/menu`` category to files under ``static/``.
+
+    The pages are rendered through the app exactly as an anonymous visitor
+    gets them, so the snapshot can be served by the CDN without a function
+    invocation. Each menu category also gets a JSON file with its products.
+    ``schedule`` coalesces bursts of admin writes into one export, and every
+    background export schedules the next one ``STATIC_SNAPSHOT_MAX_AGE``
+    seconds later, so the popularity list does not freeze between edits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer = None
+        self._app = None
+        self._exports = 0
+        self._last_export = None
+        self._last_error = None
+
+    def directory(self):
+        return os.path.join(current_app.static_folder, current_app.config['STATIC_SNAPSHOT_DIR'])
+
+    def schedule(self, delay=None):
+        """Export after ``STATIC_SNAPSHOT_DELAY`` seconds unless another change arrives first"""
+        if not current_app.config['STATIC_SNAPSHOT_ENABLED']:
+            return
+        if delay is None:
+            delay = current_app.config['STATIC_SNAPSHOT_DELAY']
+        with self._lock:
+            self._app = current_app._get_current_object()
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._export_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _export_in_background(self):
+        with self._lock:
+            self._timer = None
+        with self._app.app_context():
+            try:
+                self.export()
+            except Exception as e:
+                # The dynamic routes still serve the pages; keep the error for stats
+                with self._lock:
+                    self._last_error = str(e)
+            self.schedule(current_app.config['STATIC_SNAPSHOT_MAX_AGE'])
+
+    def export(self):
+        """Render every public page into the snapshot directory; returns the files written"""
+        client = current_app.test_client()
+        pages = {'index.html': '/'}
+        categories = ['all'] + product_categories()
+        menus = {category: [row._asdict() for row in fetch(product_rows(MENU_COLUMNS, category))]
+                 for category in categories}
+        for category in categories:
+            query = '' if category == 'all' else '?' + urlencode({'category': category})
+            pages[f'menu/{snapshot_name(category)}.html'] = '/menu' + query
+
+        files = {}
+        for name, path in pages.items():
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} returned {response.status_code}')
+            files[name] = response.get_data()
+        now = datetime.utcnow()
+        generated_at = now.isoformat()
+        expires_at = (now + timedelta(seconds=current_app.config['STATIC_SNAPSHOT_MAX_AGE'])).isoformat()
+        for category, products in menus.items():
+            files[f'menu/{snapshot_name(category)}.json'] = json.dumps({
+                'category': category,
+                'generated_at': generated_at,
+                'products': products
+            }).encode('utf-8')
+        files['manifest.json'] = json.dumps({
+            'generated_at': generated_at,
+            'expires_at': expires_at,
+            'categories': categories[1:],
+            'pages': pages
+        }).encode('utf-8')
+
+        with self._lock:
+            self._write(files)
+            self._exports += 1
+            self._last_export = generated_at
+            self._last_error = None
+        return sorted(files)
+
+    def _write(self, files):
+        root = self.directory()
+        for name, body in files.items():
+            path = os.path.join(root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written aside and renamed, so a page is never served half-written
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+        # Drop pages of categories that no longer exist
+        menu_dir = os.path.join(root, 'menu')
+        for name in os.listdir(menu_dir):
+            if f'menu/{name}' not in files:
+                os.remove(os.path.join(menu_dir, name))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': current_app.config['STATIC_SNAPSHOT_ENABLED'],
+                'pending': self._timer is not None,
+                'exports': self._exports,
+                'last_export': self._last_export,
+                'last_error': self._last_error
+            }
+
+
+static_snapshot = StaticSnapshot()
@@ -17,7 +17,7 @@ function showAddProductModal() {
 }
 
 // Show edit product modal
-function showEditProductModal(id, name, category, price, description, imageUrl) {
+function showEditProductModal(id, name, category, price, description, imageUrl, barcode) {
     const modal = document.getElementById('product-modal');
     const form = document.getElementById('product-form');
     const title = document.getElementById('modal-title');
@@ -32,6 +32,7 @@ function showEditProductModal(id, name, category, price, description, imageUrl)
     document.getElementById('product-category').value = category;
     document.getElementById('product-price').value = price;
     document.getElementById('product-description').value = description || '';
+    document.getElementById('product-barcode').value = barcode || '';
     
     // Show current image if exists
     if (imageUrl) {
@@ -97,6 +98,43 @@ function deleteProduct(productId) {
     form.submit();
 }
 
+// Bulk import products from a CSV/JSON file
+async function importProducts(input) {
+    const file = input.files[0];
+    if (!file) return;
+    
+    const formData = new FormData();
+    formData.append('file', file);
+    
+    try {
+        const response = await fetch('/admin/products/import', {
+            method: 'POST',
+            body: formData
+        });
+        const data = await response.json();
+        
+        if (data.error) {
+            alert('Import failed: ' + data.error);
+            // A file that breaks part-way keeps the rows before the error
+            if (data.inserted || data.updated) location.reload();
+            return;
+        }
+        
+        let message = `Imported ${data.inserted} new and updated ${data.updated} existing products.`;
+        if (data.error_count > 0) {
+            const details = data.errors.slice(0, 10).map(e => `Line ${e.line}: ${e.error}`).join('\n');
+            message += `\n\n${data.error_count} row(s) were skipped:\n${details}`;
+        }
+        alert(message);
+        location.reload();
+    } catch (error) {
+        console.error('Error importing products:', error);
+        alert('Error importing products');
+    } finally {
+        input.value = '';
+    }
+}
+
 // Close modal when clicking outside
 window.onclick = function(event) {
     const modal = document.getElementById('product-modal');
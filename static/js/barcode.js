@@ -46,30 +46,77 @@ function initBarcodeScanner() {
     });
 }
 
+// Scans arriving close together are resolved with one batched request
+let pendingScans = [];
+let scanFlushTimeout;
+const SCAN_BATCH_DELAY = 30; // ms
+const SCAN_BATCH_SIZE = 20;
+
 // Search product by barcode
-async function searchByBarcode(barcode) {
+function searchByBarcode(barcode) {
+    pendingScans.push(barcode);
+    document.getElementById('product-search').value = '';
+    
+    if (pendingScans.length >= SCAN_BATCH_SIZE) {
+        flushScans();
+        return;
+    }
+    
+    clearTimeout(scanFlushTimeout);
+    scanFlushTimeout = setTimeout(flushScans, SCAN_BATCH_DELAY);
+}
+
+async function flushScans() {
+    clearTimeout(scanFlushTimeout);
+    const scans = pendingScans;
+    pendingScans = [];
+    if (scans.length === 0) return;
+    
     try {
-        const response = await fetch(`/api/products?barcode=${encodeURIComponent(barcode)}`);
-        const products = await response.json();
+        const response = await fetch('/api/barcode/lookup', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                codes: scans
+            })
+        });
+        const data = await response.json();
+        
+        if (data.error) {
+            showNotification(data.error, 'error');
+            return;
+        }
         
-        if (products.length > 0) {
-            // If product found, add to cart
-            const product = products[0];
-            if (product.stock > 0) {
-                addToCart(product.id);
+        // Add in scan order; repeated scans add the product again
+        for (const code of scans) {
+            const product = data.results[code];
+            
+            if (!product || !product.is_available) {
+                showNotification(`Product not found: ${code}`, 'error');
+            } else if (product.stock > 0) {
+                await addToCart(product.id);
                 showNotification(`Product found: ${product.name}`, 'success');
             } else {
                 showNotification('Product out of stock', 'error');
             }
-        } else {
-            showNotification('Product not found', 'error');
         }
-        
-        // Clear search input
-        document.getElementById('product-search').value = '';
     } catch (error) {
+        if (typeof isNetworkError === 'function' && isNetworkError(error)) {
+            // Offline: resolve against the cached catalog
+            enterOfflineMode();
+            for (const code of scans) {
+                const product = getCachedCatalog().find(p => p.barcode === code);
+                if (product) {
+                    addToCart(product.id);
+                } else {
+                    showNotification(`Product not found: ${code}`, 'error');
+                }
+            }
+            return;
+        }
         console.error('Error searching by barcode:', error);
         showNotification('Error searching product', 'error');
     }
 }
-
@@ -2,13 +2,18 @@
 
 let cart = {};
 let taxRate = window.taxRate || 5.0; // Use taxRate from page context
+let checkoutKey = null; // Idempotency key of the checkout in progress
+let cartPromotions = {}; // Offer discounts priced by the server, by product id
 
 // Load cart from session
 async function loadCart() {
+    if (offlineMode) return;
+    
     try {
         const response = await fetch('/api/cart');
         const data = await response.json();
         cart = data.cart || {};
+        cartPromotions = data.promotions || {};
         renderCart();
         calculateTotal();
     } catch (error) {
@@ -18,6 +23,11 @@ async function loadCart() {
 
 // Add product to cart
 async function addToCart(productId) {
+    if (offlineMode) {
+        offlineAddToCart(productId);
+        return;
+    }
+    
     try {
         const response = await fetch('/api/cart/add', {
             method: 'POST',
@@ -38,10 +48,16 @@ async function addToCart(productId) {
         }
         
         cart = data.cart;
+        cartPromotions = data.promotions || {};
         renderCart();
         calculateTotal();
         showNotification('Item added to cart', 'success');
     } catch (error) {
+        if (isNetworkError(error)) {
+            enterOfflineMode();
+            offlineAddToCart(productId);
+            return;
+        }
         console.error('Error adding to cart:', error);
         showNotification('Error adding item to cart', 'error');
     }
@@ -54,6 +70,11 @@ async function updateCartItem(productId, quantity) {
         return;
     }
     
+    if (offlineMode) {
+        offlineUpdateCartItem(productId, quantity);
+        return;
+    }
+    
     try {
         const response = await fetch('/api/cart/update', {
             method: 'POST',
@@ -74,9 +95,15 @@ async function updateCartItem(productId, quantity) {
         }
         
         cart = data.cart;
+        cartPromotions = data.promotions || {};
         renderCart();
         calculateTotal();
     } catch (error) {
+        if (isNetworkError(error)) {
+            enterOfflineMode();
+            offlineUpdateCartItem(productId, quantity);
+            return;
+        }
         console.error('Error updating cart:', error);
         showNotification('Error updating cart', 'error');
     }
@@ -84,6 +111,11 @@ async function updateCartItem(productId, quantity) {
 
 // Remove item from cart
 async function removeFromCart(productId) {
+    if (offlineMode) {
+        offlineRemoveFromCart(productId);
+        return;
+    }
+    
     try {
         const response = await fetch('/api/cart/remove', {
             method: 'POST',
@@ -103,9 +135,15 @@ async function removeFromCart(productId) {
         }
         
         cart = data.cart;
+        cartPromotions = data.promotions || {};
         renderCart();
         calculateTotal();
     } catch (error) {
+        if (isNetworkError(error)) {
+            enterOfflineMode();
+            offlineRemoveFromCart(productId);
+            return;
+        }
         console.error('Error removing from cart:', error);
         showNotification('Error removing item from cart', 'error');
     }
@@ -117,6 +155,12 @@ async function clearCart() {
     
     if (!confirm('Are you sure you want to clear the cart?')) return;
     
+    if (offlineMode) {
+        offlineClearCart();
+        leaveOfflineMode();
+        return;
+    }
+    
     try {
         const response = await fetch('/api/cart/clear', {
             method: 'POST'
@@ -126,11 +170,17 @@ async function clearCart() {
         
         if (data.success) {
             cart = {};
+            cartPromotions = {};
             renderCart();
             calculateTotal();
             showNotification('Cart cleared', 'success');
         }
     } catch (error) {
+        if (isNetworkError(error)) {
+            enterOfflineMode();
+            offlineClearCart();
+            return;
+        }
         console.error('Error clearing cart:', error);
         showNotification('Error clearing cart', 'error');
     }
@@ -149,11 +199,13 @@ function renderCart() {
     
     for (const [productId, item] of Object.entries(cart)) {
         const itemTotal = item.price * item.quantity;
+        const promotion = cartPromotions[productId];
         html += `
             <div class="cart-item">
                 <div class="cart-item-info">
                     <h4>${item.name}</h4>
                     <p class="item-price">${formatCurrency(item.price)} each</p>
+                    ${promotion ? `<p class="item-offer">${promotion.offer}: -${formatCurrency(promotion.discount)}</p>` : ''}
                 </div>
                 <div class="cart-item-controls">
                     <div class="quantity-control">
@@ -181,13 +233,22 @@ function calculateTotal() {
         subtotal += item.price * item.quantity;
     }
     
+    let offerDiscount = 0;
+    for (const productId of Object.keys(cart)) {
+        if (cartPromotions[productId]) {
+            offerDiscount += cartPromotions[productId].discount;
+        }
+    }
+    
     const discountInput = document.getElementById('discount-input');
     const discount = parseFloat(discountInput.value) || 0;
     
-    const discountAmount = Math.min(discount, subtotal);
-    const total = subtotal - discountAmount;
+    const discountAmount = Math.min(discount, subtotal - offerDiscount);
+    const total = subtotal - offerDiscount - discountAmount;
     
     document.getElementById('subtotal').textContent = formatCurrency(subtotal);
+    document.getElementById('offer-discount').textContent = `-${formatCurrency(offerDiscount)}`;
+    document.getElementById('offer-discount-row').style.display = offerDiscount > 0 ? '' : 'none';
     document.getElementById('total-amount').textContent = formatCurrency(total);
 }
 
@@ -200,6 +261,21 @@ async function processOrder() {
     
     const discountInput = document.getElementById('discount-input');
     const discount = parseFloat(discountInput.value) || 0;
+    const customer = checkoutCustomer();
+    
+    // Reused on retry so a double-click never creates a second order
+    if (!checkoutKey) {
+        checkoutKey = generateIdempotencyKey();
+    }
+    
+    if (offlineMode) {
+        queueOfflineOrder(discount, checkoutKey, customer);
+        checkoutKey = null;
+        discountInput.value = 0;
+        clearCustomer();
+        calculateTotal();
+        return;
+    }
     
     try {
         const response = await fetch('/api/order/process', {
@@ -208,7 +284,10 @@ async function processOrder() {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                discount: discount
+                discount: discount,
+                idempotency_key: checkoutKey,
+                customer_name: customer.customer_name,
+                customer_phone: customer.customer_phone
             })
         });
         
@@ -220,13 +299,16 @@ async function processOrder() {
         }
         
         if (data.success) {
+            checkoutKey = null;
             showNotification('Order processed successfully!', 'success');
             
-            // Clear discount
+            // Clear discount and customer
             discountInput.value = 0;
+            clearCustomer();
             
             // Clear cart
             cart = {};
+            cartPromotions = {};
             renderCart();
             calculateTotal();
             
@@ -238,6 +320,17 @@ async function processOrder() {
             }, 1000);
         }
     } catch (error) {
+        if (isNetworkError(error)) {
+            // The server may or may not have committed; the queued copy keeps
+            // the same idempotency key, so syncing it cannot duplicate the order.
+            enterOfflineMode();
+            queueOfflineOrder(discount, checkoutKey, customer);
+            checkoutKey = null;
+            discountInput.value = 0;
+            clearCustomer();
+            calculateTotal();
+            return;
+        }
         console.error('Error processing order:', error);
         showNotification('Error processing order', 'error');
     }
@@ -248,12 +341,22 @@ function searchProducts() {
     const search = document.getElementById('product-search').value.trim();
     const category = currentCategory || 'all';
     
+    if (offlineMode) {
+        renderProducts(filterCachedCatalog(category, search));
+        return;
+    }
+    
     fetch(`/api/products?category=${category}&search=${encodeURIComponent(search)}`)
         .then(response => response.json())
         .then(products => {
             renderProducts(products);
         })
         .catch(error => {
+            if (isNetworkError(error)) {
+                enterOfflineMode();
+                renderProducts(filterCachedCatalog(category, search));
+                return;
+            }
             console.error('Error searching products:', error);
         });
 }
@@ -270,12 +373,22 @@ function filterByCategory(category) {
     
     // Fetch and render products
     const search = document.getElementById('product-search').value.trim();
+    if (offlineMode) {
+        renderProducts(filterCachedCatalog(category, search));
+        return;
+    }
+    
     fetch(`/api/products?category=${category}&search=${encodeURIComponent(search)}`)
         .then(response => response.json())
         .then(products => {
             renderProducts(products);
         })
         .catch(error => {
+            if (isNetworkError(error)) {
+                enterOfflineMode();
+                renderProducts(filterCachedCatalog(category, search));
+                return;
+            }
             console.error('Error filtering products:', error);
         });
 }
@@ -316,6 +429,46 @@ function renderProducts(products) {
     productsList.innerHTML = html;
 }
 
+// Customer details entered for the current checkout
+function checkoutCustomer() {
+    return {
+        customer_name: document.getElementById('customer-name').value.trim(),
+        customer_phone: document.getElementById('customer-phone').value.trim()
+    };
+}
+
+function clearCustomer() {
+    document.getElementById('customer-phone').value = '';
+    document.getElementById('customer-name').value = '';
+    document.getElementById('customer-info').style.display = 'none';
+}
+
+// Look up a repeat customer by phone and prefill their name
+async function lookupCustomer() {
+    const info = document.getElementById('customer-info');
+    const phone = document.getElementById('customer-phone').value.trim();
+    info.style.display = 'none';
+    if (offlineMode || phone.replace(/\D/g, '').length < 6) return;
+    
+    try {
+        const response = await fetch(`/api/customers/lookup?phone=${encodeURIComponent(phone)}`);
+        const data = await response.json();
+        if (!data.found) return;
+        
+        const customer = data.customer;
+        const nameInput = document.getElementById('customer-name');
+        if (!nameInput.value && customer.name) {
+            nameInput.value = customer.name;
+        }
+        const lastOrder = data.recent_orders[0];
+        info.textContent = `${customer.visit_count} visits, ${formatCurrency(customer.lifetime_spend)} spent` +
+            (lastOrder ? `, last ${lastOrder.created_at.slice(0, 10)}` : '');
+        info.style.display = '';
+    } catch (error) {
+        console.error('Error looking up customer:', error);
+    }
+}
+
 // Initialize - called after page loads
 function initBilling() {
     // Use taxRate from global scope (set in billing.html)
@@ -329,6 +482,12 @@ function initBilling() {
         discountInput.addEventListener('input', calculateTotal);
     }
     
+    // Customer lookup once the phone number is entered
+    const phoneInput = document.getElementById('customer-phone');
+    if (phoneInput) {
+        phoneInput.addEventListener('change', lookupCustomer);
+    }
+    
     // Product search enter key
     const productSearch = document.getElementById('product-search');
     if (productSearch) {
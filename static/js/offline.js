@@ -0,0 +1,281 @@
+/* Offline Billing Support: cached catalog, local cart and queued orders */
+
+const OFFLINE_CATALOG_KEY = 'trio.catalog.v2';
+const OFFLINE_CART_KEY = 'trio.offlineCart';
+const OFFLINE_QUEUE_KEY = 'trio.pendingOrders';
+const OFFLINE_FAILED_KEY = 'trio.failedOrders';
+const OFFLINE_SYNC_BATCH = 200;
+
+let offlineMode = false;
+let syncInProgress = false;
+
+// localStorage helpers
+function readStore(key, fallback) {
+    try {
+        const value = localStorage.getItem(key);
+        return value ? JSON.parse(value) : fallback;
+    } catch (error) {
+        return fallback;
+    }
+}
+
+function writeStore(key, value) {
+    try {
+        localStorage.setItem(key, JSON.stringify(value));
+    } catch (error) {
+        console.error('Error writing offline storage:', error);
+    }
+}
+
+// Fetch failures (not HTTP errors) mean the server is unreachable
+function isNetworkError(error) {
+    return error instanceof TypeError;
+}
+
+function generateIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return 'k' + Date.now().toString(36) + Math.random().toString(36).slice(2, 12);
+}
+
+// Catalog cache, kept current with delta syncs: {version, products: {id: product}}
+async function cacheCatalog() {
+    const cached = readStore(OFFLINE_CATALOG_KEY, null);
+    const since = cached && cached.version ? `?since=${encodeURIComponent(cached.version)}` : '';
+    
+    try {
+        const response = await fetch('/api/catalog/sync' + since);
+        if (!response.ok) return;
+        const data = await response.json();
+        
+        const products = (data.full || !cached) ? {} : cached.products;
+        data.deleted.forEach(id => {
+            delete products[id];
+        });
+        data.rows.forEach(row => {
+            const product = {};
+            data.columns.forEach((column, index) => {
+                product[column] = row[index];
+            });
+            products[product.id] = product;
+        });
+        writeStore(OFFLINE_CATALOG_KEY, { version: data.version, products: products });
+    } catch (error) {
+        // Keep the previously cached catalog
+    }
+}
+
+function getCachedCatalog() {
+    const cached = readStore(OFFLINE_CATALOG_KEY, null);
+    if (!cached) return [];
+    return Object.values(cached.products).sort((a, b) => a.name.localeCompare(b.name));
+}
+
+function filterCachedCatalog(category, search) {
+    const term = (search || '').toLowerCase();
+    return getCachedCatalog().filter(product => {
+        if (category && category !== 'all' && product.category !== category) return false;
+        if (term && !product.name.toLowerCase().includes(term)) return false;
+        return true;
+    });
+}
+
+// Offline mode switching
+function enterOfflineMode() {
+    if (offlineMode) return;
+    offlineMode = true;
+    saveOfflineCart();
+    updateOfflineIndicator();
+    showNotification('Connection lost - billing offline', 'info');
+}
+
+async function leaveOfflineMode() {
+    if (!offlineMode) return;
+    // Keep billing locally until the cart started offline is checked out
+    if (Object.keys(cart).length > 0) return;
+
+    try {
+        // The session cart may still hold items from before the connection dropped
+        await fetch('/api/cart/clear', { method: 'POST' });
+    } catch (error) {
+        return;
+    }
+
+    offlineMode = false;
+    localStorage.removeItem(OFFLINE_CART_KEY);
+    updateOfflineIndicator();
+    showNotification('Back online', 'success');
+    cacheCatalog();
+}
+
+function updateOfflineIndicator() {
+    const indicator = document.getElementById('offline-status');
+    if (!indicator) return;
+
+    const pending = readStore(OFFLINE_QUEUE_KEY, []).length;
+    if (!offlineMode && pending === 0) {
+        indicator.style.display = 'none';
+        return;
+    }
+
+    indicator.style.display = '';
+    indicator.textContent = (offlineMode ? 'Offline' : 'Syncing') + (pending ? ` · ${pending} pending` : '');
+}
+
+// Local cart (same shape as the session cart)
+function saveOfflineCart() {
+    writeStore(OFFLINE_CART_KEY, cart);
+}
+
+function refreshCartView() {
+    saveOfflineCart();
+    // Offers are priced by the server once the order syncs
+    cartPromotions = {};
+    renderCart();
+    calculateTotal();
+}
+
+function offlineAddToCart(productId, quantity = 1) {
+    const key = String(productId);
+    if (cart[key]) {
+        cart[key].quantity += quantity;
+    } else {
+        const product = getCachedCatalog().find(p => String(p.id) === key);
+        if (!product) {
+            showNotification('Product not available offline', 'error');
+            return;
+        }
+        cart[key] = {
+            name: product.name,
+            price: parseFloat(product.price),
+            quantity: quantity
+        };
+    }
+    refreshCartView();
+    showNotification('Item added to cart', 'success');
+}
+
+function offlineUpdateCartItem(productId, quantity) {
+    const key = String(productId);
+    if (!cart[key]) return;
+    if (quantity <= 0) {
+        delete cart[key];
+    } else {
+        cart[key].quantity = quantity;
+    }
+    refreshCartView();
+}
+
+function offlineRemoveFromCart(productId) {
+    delete cart[String(productId)];
+    refreshCartView();
+}
+
+function offlineClearCart() {
+    cart = {};
+    refreshCartView();
+}
+
+// Queue a completed order for upload
+function queueOfflineOrder(discount, idempotencyKey, customer) {
+    const queue = readStore(OFFLINE_QUEUE_KEY, []);
+    queue.push({
+        idempotency_key: idempotencyKey || generateIdempotencyKey(),
+        items: Object.entries(cart).map(([productId, item]) => ({
+            product_id: parseInt(productId),
+            quantity: item.quantity
+        })),
+        discount: discount,
+        customer_name: customer ? customer.customer_name : '',
+        customer_phone: customer ? customer.customer_phone : '',
+        created_at: new Date().toISOString()
+    });
+    writeStore(OFFLINE_QUEUE_KEY, queue);
+
+    offlineClearCart();
+    updateOfflineIndicator();
+    showNotification('Order saved offline, it will sync when back online', 'success');
+}
+
+// Upload queued orders; the server deduplicates by idempotency key, so a
+// batch interrupted mid-flight is simply sent again.
+async function syncPendingOrders() {
+    if (syncInProgress) return;
+    syncInProgress = true;
+
+    try {
+        let queue = readStore(OFFLINE_QUEUE_KEY, []);
+        while (queue.length > 0) {
+            const batch = queue.slice(0, OFFLINE_SYNC_BATCH);
+            const response = await fetch('/api/orders/sync', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ orders: batch })
+            });
+            if (!response.ok) break;
+
+            const data = await response.json();
+            const done = new Set();
+            const failed = readStore(OFFLINE_FAILED_KEY, []);
+            let newFailures = 0;
+            data.results.forEach((result, index) => {
+                done.add(batch[index].idempotency_key);
+                if (result.status === 'error') {
+                    failed.push(Object.assign({ error: result.error }, batch[index]));
+                    newFailures++;
+                }
+            });
+            writeStore(OFFLINE_FAILED_KEY, failed);
+
+            // Re-read the queue, orders may have been added during the upload
+            queue = readStore(OFFLINE_QUEUE_KEY, []).filter(order => !done.has(order.idempotency_key));
+            writeStore(OFFLINE_QUEUE_KEY, queue);
+            updateOfflineIndicator();
+
+            if (data.created > 0) {
+                showNotification(`${data.created} offline order(s) synced`, 'success');
+            }
+            if (newFailures > 0) {
+                showNotification(`${newFailures} offline order(s) could not be synced`, 'error');
+            }
+        }
+        leaveOfflineMode();
+    } catch (error) {
+        if (isNetworkError(error)) {
+            enterOfflineMode();
+        } else {
+            console.error('Error syncing offline orders:', error);
+        }
+    } finally {
+        syncInProgress = false;
+    }
+}
+
+function initOfflineBilling() {
+    // Resume a cart that was started while offline
+    const savedCart = readStore(OFFLINE_CART_KEY, null);
+    if (savedCart && Object.keys(savedCart).length > 0) {
+        cart = savedCart;
+        offlineMode = true;
+        renderCart();
+        calculateTotal();
+    }
+
+    window.addEventListener('offline', enterOfflineMode);
+    window.addEventListener('online', syncPendingOrders);
+
+    if (!navigator.onLine) {
+        enterOfflineMode();
+    }
+
+    updateOfflineIndicator();
+    cacheCatalog();
+    syncPendingOrders();
+    setInterval(syncPendingOrders, 30000);
+    setInterval(() => {
+        if (!offlineMode) cacheCatalog();
+    }, 60000);
+}
@@ -0,0 +1,118 @@
+"""
+Multi-store support: the active store and per-store order shards
+"""
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import sqlalchemy as sa
+from sqlalchemy.sql.util import find_tables
+from flask import current_app, has_app_context, has_request_context, session
+
+# A store's own sales data and customer ledger; the catalog, users, settings
+# and offers stay shared
+STORE_TABLES = frozenset({
+    'orders', 'order_items', 'orders_archive', 'order_items_archive', 'archived_months',
+    'daily_summaries', 'daily_product_summaries', 'daily_cashier_summaries', 'customers'
+})
+
+_store_override = ContextVar('store_override', default=None)
+
+
+def current_store():
+    """Id of the store the current request or command works for"""
+    store = _store_override.get()
+    if store:
+        return store
+    if has_request_context():
+        store = session.get('store_id')
+        if store:
+            return store
+    return current_app.config['DEFAULT_STORE']
+
+
+@contextmanager
+def use_store(store_id):
+    """Work for ``store_id`` inside the block (CLI commands, head-office fan-out)"""
+    token = _store_override.set(store_id)
+    try:
+        yield
+    finally:
+        _store_override.reset(token)
+
+
+def resolve_sqlite_url(uri):
+    """Parse a database URI; relative SQLite paths live in the instance folder, like the main database"""
+    url = sa.engine.make_url(uri)
+    if url.drivername.startswith('sqlite') and url.database and url.database != ':memory:' \
+            and not url.database.startswith('file:') and not os.path.isabs(url.database):
+        os.makedirs(current_app.instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(current_app.instance_path, url.database))
+    return url
+
+
+def touches_store_tables(mapper=None, clause=None):
+    if mapper is not None and sa.inspect(mapper).local_table.name in STORE_TABLES:
+        return True
+    if clause is not None:
+        return any(getattr(table, 'name', None) in STORE_TABLES
+                   for table in find_tables(clause, include_joins=True, include_aliases=True,
+                                            include_crud=True))
+    return False
+
+
+class ShardRouter:
+    """Per-store SQLite shards for the order tables.
+
+    The default store keeps its orders in the main database, so a
+    single-store deployment is unchanged. Every other store writes to its
+    own file, so tills at different outlets never wait on each other's
+    write locks. Each shard connection attaches the main database, which
+    lets queries join orders with products and users as before.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = {}
+
+    def enabled(self):
+        return bool(current_app.config.get('STORE_SHARD_URI'))
+
+    def route(self, mapper=None, clause=None):
+        """Engine for a statement, or None to use the main database"""
+        if not has_app_context() or not self.enabled():
+            return None
+        store = current_store()
+        if store == current_app.config['DEFAULT_STORE'] or not touches_store_tables(mapper, clause):
+            return None
+        return self.engine(store)
+
+    def engine(self, store_id):
+        engine = self._engines.get(store_id)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(store_id)
+                if engine is None:
+                    engine = self._create(store_id)
+                    self._engines[store_id] = engine
+        return engine
+
+    def _create(self, store_id):
+        # Imported here: models builds its session on top of this module
+        from models import db, upgrade_schema
+
+        catalog = db.engine.url.database
+        engine = sa.create_engine(resolve_sqlite_url(
+            current_app.config['STORE_SHARD_URI'].format(store=store_id)))
+
+        @sa.event.listens_for(engine, 'connect')
+        def attach_catalog(dbapi_connection, connection_record):
+            dbapi_connection.execute('ATTACH DATABASE ? AS catalog', (catalog,))
+
+        tables = [table for table in db.metadata.sorted_tables if table.name in STORE_TABLES]
+        db.metadata.create_all(engine, tables=tables)
+        upgrade_schema(engine, tables)
+        return engine
+
+
+shard_router = ShardRouter()